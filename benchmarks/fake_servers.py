@@ -0,0 +1,171 @@
+"""
+Local stand-ins for the OpenAI and You.com chat APIs, so benchmarks run offline and with controlled timings.
+`latency` delays the first byte of every response; `tokens_per_second` paces streamed tokens.
+"""
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DEFAULT_ANSWER = "The You.com API offers web search, news search and chat endpoints that return grounded answers."
+
+
+def tokenize_answer(answer: str) -> list[str]:
+    words = answer.split(" ")
+    return [words[0]] + [" " + word for word in words[1:]]
+
+
+def fake_embedding(text, dim: int) -> list[float]:
+    """Deterministic unit vector per input, so identical chunks always embed identically."""
+    seed = zlib.crc32(json.dumps(text).encode("utf-8"))
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeServer:
+    handler_class: type = None
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, answer: str = DEFAULT_ANSWER):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer = answer
+        self.requests = 0
+        handler = type(self.handler_class.__name__, (self.handler_class,), {"fake": self})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def tokens(self):
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for token in tokenize_answer(self.answer):
+            if delay:
+                time.sleep(delay)
+            yield token
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    fake: FakeServer = None
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_event_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def send_event(self, data: str, event: str = None):
+        message = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        chunk = message.encode("utf-8")
+        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def end_event_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def begin(self):
+        self.fake.requests += 1
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeOpenAIHandler(FakeHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.begin()
+        path = urlparse(self.path).path
+        if path.endswith("/embeddings"):
+            self.embeddings(request)
+        elif path.endswith("/chat/completions"):
+            self.chat(request)
+        else:
+            self.send_error(404)
+
+    def embeddings(self, request: dict):
+        inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        dim = request.get("dimensions") or 256
+        self.send_json(
+            {
+                "object": "list",
+                "model": request["model"],
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(text, dim)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        )
+
+    def chat(self, request: dict):
+        completion = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request["model"]}
+        if not request.get("stream"):
+            message = {"role": "assistant", "content": "".join(self.fake.tokens())}
+            choice = {"index": 0, "message": message, "finish_reason": "stop"}
+            self.send_json({**completion, "object": "chat.completion", "choices": [choice]})
+            return
+
+        self.start_event_stream()
+        chunk = {**completion, "object": "chat.completion.chunk"}
+        for token in self.fake.tokens():
+            choice = {"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}
+            self.send_event(json.dumps({**chunk, "choices": [choice]}))
+        self.send_event(json.dumps({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        self.send_event("[DONE]")
+        self.end_event_stream()
+
+
+class FakeYDCHandler(FakeHandler):
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.begin()
+        if params.get("stream", ["False"])[0] != "True":
+            self.send_json({"answer": self.fake.answer, "search_results": []})
+            return
+
+        self.start_event_stream()
+        self.send_event("[]", event="search_results")
+        for token in self.fake.tokens():
+            self.send_event(token, event="token")
+        self.end_event_stream()
+
+
+class FakeOpenAIServer(FakeServer):
+    """Chat completions (plain and streamed) and embeddings under `/v1`."""
+
+    handler_class = FakeOpenAIHandler
+
+    @property
+    def url(self) -> str:
+        return super().url + "/v1"
+
+
+class FakeYDCServer(FakeServer):
+    """The Smart and Research endpoints of chat-api.you.com, as JSON or server-sent events."""
+
+    handler_class = FakeYDCHandler
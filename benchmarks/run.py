@@ -0,0 +1,304 @@
+"""
+Offline benchmark suite. Starts local OpenAI and You.com stand-ins and measures:
+
+- `QA_Bot` construction time
+- chunking time of `TokenChunker` against `RecursiveCharacterTextSplitter`, and the tokens each produces
+- ingestion throughput of `FileIndexManager.sync`
+- `QA_Bot.run` latency
+- time to first token of `get_ydc_stream_answer`
+- peak Python heap during ingestion and peak RSS of the process
+
+Results are printed as JSON. Pass `--baseline` with an earlier result to exit non-zero when a metric regresses
+by more than `--tolerance`.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from benchmarks.fake_servers import FakeOpenAIServer, FakeYDCServer
+
+# metric -> True if higher is better
+METRICS = {
+    "construction_s": False,
+    "chunking_s": False,
+    "ingestion_chunks_per_s": True,
+    "ingestion_mb_per_s": True,
+    "run_p50_s": False,
+    "run_p95_s": False,
+    "ydc_ttft_p50_s": False,
+    "ydc_total_p50_s": False,
+    "ingestion_peak_heap_mb": False,
+}
+
+WORDS = (
+    "api search news results query answer model token stream index vector chunk file upload agent tool web chat "
+    "latency cache embedding document retrieval prompt context summary memory session thread request response"
+).split()
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def write_corpus(directory: str, num_files: int, rows_per_file: int, seed: int = 0) -> dict:
+    from api_chatbot_demo.streamlit.utils import UploadedFile
+
+    rng = random.Random(seed)
+    files = {}
+    for i in range(num_files):
+        path = os.path.join(directory, f"corpus_{i}.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "title", "body"])
+            for row in range(rows_per_file):
+                body = " ".join(rng.choices(WORDS, k=rng.randint(40, 160)))
+                writer.writerow([row, f"record {i}-{row}", body])
+        files[path] = UploadedFile(f"corpus_{i}.csv", path, description="synthetic benchmark corpus")
+    return files
+
+
+def create_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+
+    from api_chatbot_demo.ai.tokens import get_encoding
+
+    if get_encoding() is not None:
+        return OpenAIEmbeddings()
+
+    class RawTextOpenAIEmbeddings(OpenAIEmbeddings):
+        # without tiktoken's encodings, OpenAIEmbeddings falls back to one request per text; send raw strings in
+        # the same `chunk_size` batches the tokenizing path would use, so request counts match production
+        def embed_documents(self, texts, chunk_size=0):
+            batch_size = chunk_size or self.chunk_size
+            embeddings = []
+            for start in range(0, len(texts), batch_size):
+                response = self.client.create(input=texts[start:start + batch_size], **self._invocation_params)
+                embeddings.extend(r.embedding for r in response.data)
+            return embeddings
+
+    return RawTextOpenAIEmbeddings(check_embedding_ctx_length=False)
+
+
+def write_prose(num_paragraphs: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(num_paragraphs):
+        sentences = [" ".join(rng.choices(WORDS, k=rng.randint(5, 30))).capitalize() + "." for _ in range(8)]
+        paragraphs.append(" ".join(sentences[:rng.randint(1, 8)]))
+    return "\n\n".join(paragraphs)
+
+
+def create_index(cache_dir: str):
+    from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+    from api_chatbot_demo.ai.embeddings import CachedEmbeddings, EmbeddingCache
+    from api_chatbot_demo.ai.index import FileIndexManager
+    from api_chatbot_demo.ai.splitters import TokenChunker
+
+    # a fresh cache per index, so every chunk really goes through the embeddings endpoint
+    cache = EmbeddingCache(os.path.join(cache_dir, f"embeddings-{time.perf_counter_ns()}.sqlite"))
+    embeddings = CachedEmbeddings(create_embeddings(), cache)
+    return FileIndexManager(embeddings, MultiTypeDataLoader(), TokenChunker())
+
+
+def bench_construction(llm, repeats: int, cache_dir: str) -> dict:
+    from api_chatbot_demo.ai.agents import QA_Bot
+    from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+    from api_chatbot_demo.ai.embeddings import EmbeddingCache
+
+    cache = EmbeddingCache(os.path.join(cache_dir, "construction.sqlite"))
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        QA_Bot(llm, "You are a helpful assistant.", {}, MultiTypeDataLoader(), embedding_cache=cache)
+        timings.append(time.perf_counter() - start)
+    return {"construction_s": statistics.median(timings)}
+
+
+def bench_chunking(num_paragraphs: int, repeats: int) -> dict:
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from api_chatbot_demo.ai.splitters import TokenChunker
+    from api_chatbot_demo.ai.tokens import CHARS_PER_TOKEN, count_tokens, get_encoding
+
+    docs = [
+        Document(page_content=write_prose(num_paragraphs, seed), metadata={"source": "prose.pdf"}) for seed in range(4)
+    ]
+    splitters = {
+        "chunking": TokenChunker(),
+        # the splitter `create_file_index` used before chunks were sized in tokens
+        "chunking_baseline": RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100),
+    }
+    results = {}
+    for name, splitter in splitters.items():
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            chunks = splitter.split_documents(docs)
+            timings.append(time.perf_counter() - start)
+        tokens = [count_tokens(chunk.page_content) for chunk in chunks]
+        results[f"{name}_s"] = statistics.median(timings)
+        results[f"{name}_chunks"] = len(chunks)
+        results[f"{name}_tokens"] = sum(tokens)
+        results[f"{name}_max_chunk_tokens"] = max(tokens)
+    results["chunking_speedup"] = results["chunking_baseline_s"] / results["chunking_s"]
+    # offline, tiktoken cannot download its BPE files and both timings and token counts use the estimate
+    results["chunking_tokenizer"] = "cl100k_base" if get_encoding() is not None else f"chars/{CHARS_PER_TOKEN} estimate"
+    return results
+
+
+def bench_ingestion(files: dict, cache_dir: str) -> tuple[dict, object]:
+    index = create_index(cache_dir)
+    size = sum(os.path.getsize(path) for path in files)
+    start = time.perf_counter()
+    index.sync(files)
+    elapsed = time.perf_counter() - start
+    return {
+        "ingestion_s": elapsed,
+        "ingestion_chunks": len(index),
+        "ingestion_chunks_per_s": len(index) / elapsed,
+        "ingestion_mb_per_s": size / elapsed / 2**20,
+    }, index
+
+
+def bench_ingestion_memory(files: dict, cache_dir: str) -> dict:
+    tracemalloc.start()
+    try:
+        create_index(cache_dir).sync(files)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ingestion_peak_heap_mb": peak / 2**20}
+
+
+def bench_run(llm, files: dict, index, repeats: int) -> dict:
+    from api_chatbot_demo.ai.agents import QA_Bot
+    from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+
+    bot = QA_Bot(llm, "You are a helpful assistant.", files, MultiTypeDataLoader(), index=index)
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        bot.run(f"question {i}: what does the API return?")
+        timings.append(time.perf_counter() - start)
+    return {"run_p50_s": percentile(timings, 0.5), "run_p95_s": percentile(timings, 0.95)}
+
+
+def bench_ydc_stream(repeats: int) -> dict:
+    import streamlit as st
+
+    from api_chatbot_demo.streamlit.utils import get_ydc_client, get_ydc_stream_answer
+
+    # the client is a cached resource; drop any instance pointing at a previous run's server
+    get_ydc_client.clear()
+    first_tokens, totals = [], []
+    for i in range(repeats):
+        st.session_state.messages = [{"role": "user", "content": f"question {i}: how do I call the search API?"}]
+        st.session_state.chat_id = f"bench-{i}"
+        st.session_state.pop("conversation", None)
+        start = time.perf_counter()
+        first_token = None
+        for _ in get_ydc_stream_answer(use_cache=False):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        first_tokens.append(first_token)
+        totals.append(time.perf_counter() - start)
+    return {"ydc_ttft_p50_s": percentile(first_tokens, 0.5), "ydc_total_p50_s": percentile(totals, 0.5)}
+
+
+def run(args) -> dict:
+    from langchain_openai import ChatOpenAI
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        openai_server = stack.enter_context(FakeOpenAIServer(args.latency, args.tokens_per_second))
+        ydc_server = stack.enter_context(FakeYDCServer(args.latency, args.tokens_per_second))
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        # every client in the app resolves its endpoint from the environment; nothing may reach the real APIs
+        environment = {
+            "OPENAI_API_KEY": "bench",
+            "OPENAI_API_BASE": openai_server.url,
+            "OPENAI_BASE_URL": openai_server.url,
+            "YDC_API_KEY": "bench",
+            "YDC_API_URL": ydc_server.url,
+        }
+        stack.enter_context(mock.patch.dict(os.environ, environment))
+        llm = ChatOpenAI(model="gpt-4o", temperature=0)
+        files = write_corpus(tmp, args.files, args.rows)
+
+        results.update(bench_construction(llm, args.repeats, tmp))
+        results.update(bench_chunking(args.paragraphs, args.repeats))
+        ingestion, index = bench_ingestion(files, tmp)
+        results.update(ingestion)
+        results.update(bench_run(llm, files, index, args.repeats))
+        results.update(bench_ydc_stream(args.repeats))
+        results.update(bench_ingestion_memory(files, tmp))
+
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for metric, higher_is_better in METRICS.items():
+        old, new = baseline.get(metric), results.get(metric)
+        if not old or new is None:
+            continue
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            regressions.append(f"{metric}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4, help="number of synthetic CSV files to ingest")
+    parser.add_argument("--rows", type=int, default=500, help="rows per CSV file")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="paragraphs per synthetic document to chunk")
+    parser.add_argument("--repeats", type=int, default=5, help="samples per latency metric")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before each fake response starts")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="pace of streamed fake tokens")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression per metric")
+    args = parser.parse_args(argv)
+
+    # the agent and the loaders log to stdout; keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "platform": {"python": platform.python_version(), "machine": platform.machine()},
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
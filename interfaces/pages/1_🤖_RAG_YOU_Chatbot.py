@@ -1,5 +1,7 @@
 import os
+import threading
 import time
+import weakref
 
 import dotenv
 import streamlit as st
@@ -7,9 +9,13 @@ from langchain.chains import ConversationChain
 from langchain_openai import ChatOpenAI
 
 from api_chatbot_demo.ai.agents import QA_Bot
+from api_chatbot_demo.ai.checkpoint import CompactingSqliteSaver
 from api_chatbot_demo.ai.chains import get_basic_conversation_chain
 from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+from api_chatbot_demo.ai.index import create_file_index
+from api_chatbot_demo.ai.registry import BotRegistry
 from api_chatbot_demo.streamlit.llm_blocks import (
+    clear_chat_page_cache,
     file_upload_st_block,
     llm_chatbot_st_block,
     llm_system_prompt_block,
@@ -18,17 +24,70 @@ from api_chatbot_demo.streamlit.llm_blocks import (
 dotenv.load_dotenv(".env", override=True)
 
 
+MODEL = "gpt-4o"
+NUM_WEB_RESULTS = 10
+
+
+@st.cache_resource
+def get_bot_registry() -> BotRegistry:
+    # process-wide: sessions that upload the same files share one index
+    return BotRegistry()
+
+
 @st.cache_resource
-def get_chatbot_resource() -> ConversationChain:
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.5)
-    return QA_Bot(
-        llm,
-        files=st.session_state.uploaded_files,
-        system_prompt=st.session_state.system_prompt,
-        dataloader=MultiTypeDataLoader(),
-        num_web_results_to_fetch=10
+def get_checkpointer() -> CompactingSqliteSaver:
+    # conversations survive server restarts; the thread id is kept in the page URL
+    return CompactingSqliteSaver()
+
+
+@st.cache_resource
+def get_open_threads() -> tuple[threading.Lock, weakref.WeakValueDictionary]:
+    # thread id -> the live bot writing to it, so a URL opened in a second tab does not share its conversation
+    return threading.Lock(), weakref.WeakValueDictionary()
+
+
+def get_chatbot_resource() -> QA_Bot:
+    """
+    Build this session's bot around the shared index for its files.
+    If only the files changed since the last build, the existing bot and its conversation are kept.
+    """
+    files = st.session_state.uploaded_files
+    dataloader = MultiTypeDataLoader()
+    previous = st.session_state.get('chatbot_resource')
+    index = get_bot_registry().get_index(
+        files,
+        create_index=lambda: create_file_index(dataloader),
+        base=previous.index if previous is not None else None
     )
 
+    config = (st.session_state.system_prompt, MODEL, NUM_WEB_RESULTS)
+    if previous is not None and st.session_state.get('chatbot_config') == config:
+        previous.update_files(files, index=index)
+        return previous
+
+    st.session_state.chatbot_config = config
+    # the new bot has its own conversation; only a fresh session resumes the thread in its URL
+    clear_chat_page_cache()
+    thread_id = st.query_params.get('thread') if previous is None else None
+    llm = ChatOpenAI(model=MODEL, temperature=0.5)
+    lock, open_threads = get_open_threads()
+    with lock:
+        if thread_id in open_threads:
+            thread_id = None
+        chatbot = QA_Bot(
+            llm,
+            files=files,
+            system_prompt=st.session_state.system_prompt,
+            dataloader=dataloader,
+            num_web_results_to_fetch=NUM_WEB_RESULTS,
+            index=index,
+            checkpointer=get_checkpointer(),
+            thread_id=thread_id
+        )
+        open_threads[chatbot.thread_id] = chatbot
+    st.query_params['thread'] = chatbot.thread_id
+    return chatbot
+
 
 st.set_page_config(page_title="Chatbot Demo", page_icon="🤖")
 
@@ -3,22 +3,30 @@ from typing import Any, Dict, List
 
 import streamlit as st
 
-from api_chatbot_demo.ai.prompts import SYSTEM_PROMPT
-from api_chatbot_demo.streamlit.utils import get_ydc_stream_answer
+from api_chatbot_demo.ai.docs import DocsSectionRetriever
+from api_chatbot_demo.streamlit.llm_blocks import chat_messages_st_block, clear_chat_page_cache
+from api_chatbot_demo.streamlit.utils import get_response_cache, get_ydc_stream_answer
+
+
+@st.cache_resource
+def get_docs_retriever() -> DocsSectionRetriever:
+    return DocsSectionRetriever()
 
 
 # Better way to clear history
 def clear_chat_history():
     st.session_state.chat_id = str(uuid.uuid4())
     st.session_state["messages"] = [
-        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "assistant", "content": "What can I help you build today?"}
     ]
+    clear_chat_page_cache("docs_chat")
 
 
 with st.sidebar:
     model_select = st.selectbox("Select a model", ["smart", "research"])
     st.button('Reset Chat', on_click=clear_chat_history)
+    st.caption(f"Docs retrieval hit rate: {get_docs_retriever().hit_rate:.0%}")
+    st.caption(f"Response cache hit ratio: {get_response_cache().stats()['hit_ratio']:.0%}")
 
 
 ydc_api_key = st.secrets["YDC_API_KEY"]
@@ -30,14 +38,14 @@ st.caption(""" 🚀 Let us help you build with You.com""")
 if "messages" not in st.session_state:
     st.session_state.chat_id = str(uuid.uuid4())
     st.session_state["messages"] = [
-        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "assistant", "content": "What can I help you build today?"}
     ]
 
-# Display or clear messages
-for msg in st.session_state.messages:
-    if msg["role"] != "system":
-        st.chat_message(msg["role"]).write(msg["content"])
+# Display or clear messages; older turns are collapsed so reruns stay cheap in long sessions
+chat_messages_st_block(
+    [(msg["role"], msg["content"]) for msg in st.session_state.messages if msg["role"] != "system"],
+    key="docs_chat"
+)
 
 # User provided prompt
 if prompt := st.chat_input():
@@ -49,7 +57,10 @@ if prompt := st.chat_input():
 # Generate response if last reponse not from assistant
 if st.session_state.messages[-1]["role"] != "assistant":
     with st.chat_message("assistant"):
-        response = get_ydc_stream_answer(model_select)
+        # send only the documentation sections relevant to this question instead of the whole API docs
+        system_prompt = get_docs_retriever().build_system_prompt(st.session_state.messages[-1]["content"])
+        # after the first turn the server holds the conversation under chat_id, so only the new turn is sent
+        response = get_ydc_stream_answer(model_select, delta=True, system=system_prompt)
         full_response = st.write_stream(response)
         message = {"role": "assistant", "content": full_response}
         st.session_state.messages.append(message)
@@ -1,32 +1,40 @@
+import asyncio
 import secrets
+from pathlib import Path
+from typing import AsyncIterator
 
-from langchain.agents import AgentExecutor, create_tool_calling_agent, tool
+from langchain.agents import create_tool_calling_agent, tool
 from langchain.chat_models import ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.tools.retriever import create_retriever_tool
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.document_loaders.csv_loader import CSVLoader
 from langchain_community.llms import OpenAI
 from langchain_community.tools.you import YouSearchTool
-from langchain_community.utilities.you import YouSearchAPIWrapper
-from langchain_community.vectorstores import FAISS
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_experimental.agents.agent_toolkits import create_python_agent
-from langchain_experimental.tools.python.tool import PythonREPLTool
-from langchain_openai import OpenAIEmbeddings
-from langgraph.checkpoint import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver, empty_checkpoint
 from langgraph.prebuilt import chat_agent_executor
 
 from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+from api_chatbot_demo.ai.embeddings import EmbeddingCache, get_embedding_cache
+from api_chatbot_demo.ai.executor import ConcurrentAgentExecutor
+from api_chatbot_demo.ai.index import FileIndexManager, create_file_index
+from api_chatbot_demo.ai.memory import SummaryBufferChatHistory
+from api_chatbot_demo.ai.sandbox import PooledPythonREPLTool, PythonSessionCallbackHandler
+from api_chatbot_demo.ai.tools import CachedYouSearchAPIWrapper, create_database_schema_tool
 from api_chatbot_demo.streamlit.utils import UploadedFile
+from api_chatbot_demo.tracing import get_tracer
 
 
 def get_python_agent():
+    # code runs in the shared worker pool, isolated from the server process and from other sessions;
+    # the steps of a run share one worker, which is returned when the run ends
     return create_python_agent(
         llm=OpenAI(temperature=0, max_tokens=1000),
-        tool=PythonREPLTool(),
-        verbose=True
+        tool=PooledPythonREPLTool(),
+        verbose=True,
+        agent_executor_kwargs={"callbacks": [PythonSessionCallbackHandler()]}
     )
 
 
@@ -34,7 +42,22 @@ class ChatBot():
     def run(self, input: str) -> str:
         raise NotImplemented
 
-    def get_chat_history(self) -> ChatMessageHistory:
+    async def astream(self, input: str) -> AsyncIterator[dict]:
+        """
+        Yield events as the answer is produced: `{"event": "token", "data": str}` for answer tokens and
+        `{"event": "tool_start" | "tool_end", "name": str, "data": ...}` around tool calls.
+        Bots without native streaming yield the whole answer as a single token.
+        """
+        yield {"event": "token", "data": await asyncio.to_thread(self.run, input)}
+
+    async def arun(self, input: str) -> str:
+        output = ""
+        async for event in self.astream(input):
+            if event["event"] == "token":
+                output += event["data"]
+        return output
+
+    def get_chat_history(self) -> BaseChatMessageHistory:
         raise NotImplemented
 
 
@@ -45,11 +68,17 @@ class QA_Bot(ChatBot):
         system_prompt: str,
         files: dict[str, UploadedFile],
         dataloader: MultiTypeDataLoader,
-        num_web_results_to_fetch: int = 10
+        num_web_results_to_fetch: int = 10,
+        embedding_cache: EmbeddingCache = None,
+        max_history_tokens: int = 2000,
+        index: FileIndexManager = None,
+        checkpointer: BaseCheckpointSaver = None,
+        thread_id: str = None
     ):
 
         self.llm = llm
         self.dataloader = dataloader
+        self.embedding_cache = embedding_cache or get_embedding_cache()
         self.system_prompt = prompt = ChatPromptTemplate.from_messages(
             [
                 ("system", system_prompt),
@@ -59,68 +88,154 @@ class QA_Bot(ChatBot):
             ]
         )
         self.tools = []
-        self.agent_memory = MemorySaver()
-        self.chat_history = ChatMessageHistory()
+        # one bounded store backs both the displayed chat and the agent's conversation context
+        self.chat_history = SummaryBufferChatHistory(llm=self.llm, max_token_limit=max_history_tokens)
+
+        # instantiate the YDC search tool in Langchain
+        # results are cached and concurrent identical searches are coalesced, across sessions
+        ydc_api_wrapper = CachedYouSearchAPIWrapper(num_web_results=num_web_results_to_fetch)
+        self.ydc_search_tool = YouSearchTool(api_wrapper=ydc_api_wrapper)
 
-        if len(files):
-            docs = self.load_files(files)
+        # split the docs into chunks, vectorize the chunks and load them into a vector store,
+        # unless an index already built over these files (e.g. shared through a BotRegistry) is given
+        self.index = index if index is not None else self.create_vector_store()
+        self.files = {}
+        self.update_files(files, index=index)
 
+        # generate a thread ID for to keep track of conversation history
+        # with a checkpointer, passing a previous thread ID resumes that conversation (e.g. after a restart)
+        self.checkpointer = checkpointer
+        self.thread_id = thread_id or self.generate_thread_id()
+        self.load_checkpoint()
+
+    def create_vector_store(self) -> FileIndexManager:
+        return create_file_index(self.dataloader, self.embedding_cache)
+
+    def update_files(self, files: dict[str, UploadedFile], index: FileIndexManager = None) -> dict[str, list[str]]:
+        """
+        Re-index only the files that were added, replaced or removed, then swap the updated retriever into the agent.
+        If `index` is given it must already be synced to `files`; it replaces the current index without changes.
+        The conversation thread is kept.
+        """
+        if index is not None:
+            self.index = index
+            changes = {"added": [], "removed": [], "unchanged": list(files)}
+        else:
+            changes = self.index.sync(files)
+        self.files = dict(files)
+        self.build_agent()
+        return changes
+
+    def build_agent(self):
+        self.tools = []
+        if self.files and len(self.index):
             files_description = {}
-            for _, file in files.items():
+            for _, file in self.files.items():
                 files_description[file.name] = file.description
 
-            # split the docs into chunks, vectorize the chunks and load them into a vector store
-            db = self.create_vector_store(docs)
-
             # convert this retriever into a Langchain tool
             faiss_retriever_tool = create_retriever_tool(
-                db.as_retriever(),
+                self.index.as_retriever(),
                 name="file_database",
                 description=f"Files in store:\n{str(files_description)}"
             )
             self.tools.append(faiss_retriever_tool)
 
-        # instantiate the YDC search tool in Langchain
-        ydc_api_wrapper = YouSearchAPIWrapper(num_web_results=num_web_results_to_fetch)
-        ydc_search_tool = YouSearchTool(api_wrapper=ydc_api_wrapper)
+        # rows of uploaded databases are searched through file_database; the schema is a tool of its own
+        databases = {file.name: file.path for file in self.files.values() if Path(file.path).suffix == ".db"}
+        if databases:
+            self.tools.append(create_database_schema_tool(databases))
 
         # create a list of tools that will be supplied to the Langchain agent
-        self.tools.append(ydc_search_tool)
+        self.tools.append(self.ydc_search_tool)
 
         agent = create_tool_calling_agent(self.llm, self.tools, self.system_prompt)
-        self.agent_executor = AgentExecutor(agent=agent, tools=self.tools, verbose=True, checkpointer=self.agent_memory)
+        # tool calls requested in the same step, e.g. a file and a web search, run side by side
+        self.agent_executor = ConcurrentAgentExecutor(agent=agent, tools=self.tools, verbose=True)
 
         # create the agent executor
         # self.agent_executor = chat_agent_executor.create_tool_calling_executor(
-        #     self.llm, self.tools, prompt=self.system_prompt, checkpointer=self.agent_memory)
-
-        # generate a thread ID for to keep track of conversation history
-        self.thread_id = self.generate_thread_id()
-
-    def load_files(self, files: set[UploadedFile]) -> list:
-        docs = []
-        for _, file in files.items():
-            docs.extend(self.dataloader(file.path))
-        return docs
-
-    def create_vector_store(self, docs: list) -> FAISS:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunked_docs = text_splitter.split_documents(docs)
-        embeddings = OpenAIEmbeddings()
-        return FAISS.from_documents(documents=chunked_docs, embedding=embeddings)
+        #     self.llm, self.tools, prompt=self.system_prompt, checkpointer=self.checkpointer)
 
     def generate_thread_id(self) -> str:
         thread_id = secrets.token_urlsafe(16)
         return thread_id
 
+    def load_checkpoint(self):
+        if self.checkpointer is None:
+            return
+        checkpoint = self.checkpointer.get({"configurable": {"thread_id": self.thread_id}})
+        if checkpoint is None:
+            return
+        self.chat_history.set_state(checkpoint["channel_values"])
+
+    def save_checkpoint(self):
+        if self.checkpointer is None:
+            return
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = self.chat_history.get_state()
+        self.checkpointer.put(
+            {"configurable": {"thread_id": self.thread_id}}, checkpoint, {"source": "update", "step": -1}
+        )
+
     def run(self, input_str: str) -> str:
-        input = {"input": input_str}
-        config = {"configurable": {"thread_id": self.thread_id}}
+        tracer = get_tracer()
+        with tracer.span("agent.run", thread_id=self.thread_id) as span:
+            input = {"input": input_str, "chat_history": self.chat_history.messages}
+            config = {"configurable": {"thread_id": self.thread_id}, "callbacks": tracer.callbacks()}
+
+            self.chat_history.add_user_message(input_str)
+            output = self.agent_executor.invoke(input=input, config=config)["output"]
+            self.chat_history.add_ai_message(output)
+            self.save_checkpoint()
+            span.set(output_chars=len(output))
+        return output
+
+    async def astream(self, input_str: str) -> AsyncIterator[dict]:
+        # the span is finished explicitly rather than made current, since it stays open across yields
+        tracer = get_tracer()
+        span = tracer.start_span("agent.astream", thread_id=self.thread_id)
+        input = {"input": input_str, "chat_history": self.chat_history.messages}
+        config = {"configurable": {"thread_id": self.thread_id}, "callbacks": tracer.callbacks(parent=span)}
 
         self.chat_history.add_user_message(input_str)
-        output = self.agent_executor.invoke(input=input, config=config)["output"]
+        output = ""
+        error = None
+        try:
+            async for event in self.agent_executor.astream_events(input, config=config, version="v2"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    # tool-calling steps stream empty content, so only answer text reaches the caller
+                    if content := event["data"]["chunk"].content:
+                        span.first_token()
+                        yield {"event": "token", "data": content}
+                elif kind == "on_tool_start":
+                    yield {"event": "tool_start", "name": event["name"], "data": event["data"].get("input")}
+                elif kind == "on_tool_end":
+                    yield {"event": "tool_end", "name": event["name"], "data": event["data"].get("output")}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    output = event["data"]["output"]["output"]
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            span.set(output_chars=len(output))
+            tracer.finish(span, error)
         self.chat_history.add_ai_message(output)
+        self.save_checkpoint()
+
+    async def arun(self, input_str: str) -> str:
+        tracer = get_tracer()
+        with tracer.span("agent.run", thread_id=self.thread_id) as span:
+            input = {"input": input_str, "chat_history": self.chat_history.messages}
+            config = {"configurable": {"thread_id": self.thread_id}, "callbacks": tracer.callbacks()}
+
+            self.chat_history.add_user_message(input_str)
+            output = (await self.agent_executor.ainvoke(input=input, config=config))["output"]
+            self.chat_history.add_ai_message(output)
+            self.save_checkpoint()
+            span.set(output_chars=len(output))
         return output
 
-    def get_chat_history(self) -> ChatMessageHistory:
+    def get_chat_history(self) -> BaseChatMessageHistory:
         return self.chat_history
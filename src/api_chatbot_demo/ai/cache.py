@@ -0,0 +1,197 @@
+import asyncio
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable
+
+import numpy as np
+
+from api_chatbot_demo.ai.lexical import content_terms
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire `ttl` seconds after they were set."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._entries)
+
+    def _expire(self):
+        now = self.clock()
+        for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def items(self) -> list[tuple[Hashable, object]]:
+        with self._lock:
+            self._expire()
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function and every caller that
+    arrives while it is in flight receives the same result (or exception). Works across threads and event loops.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], object]):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable]):
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def hashed_ngram_embedding(text: str, dim: int = 1024) -> np.ndarray:
+    """
+    Cheap local embedding: word unigrams and bigrams hashed into a fixed-size, L2-normalised vector.
+    Good enough to match rephrasings of the same short question without an API call.
+    """
+    words = text.split()
+    vector = np.zeros(dim, dtype=np.float32)
+    for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        vector[zlib.crc32(gram.encode("utf-8")) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticResponseCache:
+    """
+    Caches streamed answers by normalised query. A lookup first tries an exact match, then the most similar
+    cached query within the same namespace whose cosine similarity reaches `threshold`.
+    Only queries with the same set of content words (non-stopwords) can match: a long question that differs in a
+    single word ("... in Python" vs "... in JavaScript") is still similar, but asks something else.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        ttl: float = 3600,
+        max_entries: int = 512,
+        embed: Callable[[str], np.ndarray] = hashed_ngram_embedding,
+    ):
+        self.threshold = threshold
+        self.embed = embed
+        self.entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def lookup(self, query: str, namespace: str = "") -> list[str]:
+        key = (namespace, normalize_query(query))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry[1]
+
+        terms = set(content_terms(key[1]))
+        candidates = [
+            (k, value) for k, value in self.entries.items() if k[0] == namespace and set(content_terms(k[1])) == terms
+        ]
+        if candidates and key[1]:
+            similarities = np.stack([vector for _, (vector, _) in candidates]) @ self.embed(key[1])
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                self.semantic_hits += 1
+                matched_key, (_, tokens) = candidates[best]
+                # refresh the LRU position of the matched entry
+                self.entries.get(matched_key)
+                return tokens
+
+        self.misses += 1
+        return None
+
+    def store(self, query: str, tokens: list[str], namespace: str = ""):
+        normalized = normalize_query(query)
+        self.entries.set((namespace, normalized), (self.embed(normalized), list(tokens)))
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
@@ -2,6 +2,8 @@ from langchain.chains import ConversationChain
 from langchain.chains.conversation.memory import ConversationBufferMemory
 from langchain.chat_models import ChatOpenAI
 
+from api_chatbot_demo.ai.memory import SummaryBufferChatHistory
+
 
 def get_basic_conversation_chain(model_name='gpt-3.5-turbo'):
 
@@ -12,5 +14,5 @@ def get_basic_conversation_chain(model_name='gpt-3.5-turbo'):
 
     return ConversationChain(
         llm=llm,
-        memory=ConversationBufferMemory()
+        memory=ConversationBufferMemory(chat_memory=SummaryBufferChatHistory(llm=llm))
     )
@@ -0,0 +1,184 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.serde.base import SerializerProtocol
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(".cache", "checkpoints.sqlite")
+
+
+class CompactingSqliteSaver(BaseCheckpointSaver):
+    """
+    SQLite-backed checkpoint saver for long-running multi-session servers.
+
+    - Writes are buffered and flushed in one transaction every `flush_interval` seconds or `batch_size` puts.
+      Reads see buffered writes.
+    - Only the newest `keep_last` checkpoints of a thread are kept; older ones are deleted when the thread is flushed.
+    - Threads not touched for `max_idle_seconds` are deleted by `expire_idle`, which runs with the periodic flush.
+    Only the write buffer lives in memory, so resident size does not grow with the number of threads.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CHECKPOINT_PATH,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        keep_last: int = 1,
+        batch_size: int = 32,
+        flush_interval: float = 2.0,
+        max_idle_seconds: float = 7 * 24 * 3600,
+    ):
+        super().__init__(serde=serde)
+        self.keep_last = keep_last
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_idle_seconds = max_idle_seconds
+        self._pending: dict[tuple[str, str], tuple[bytes, bytes, Optional[str], float]] = {}
+        self._lock = threading.RLock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " thread_id TEXT NOT NULL,"
+            " thread_ts TEXT NOT NULL,"
+            " parent_ts TEXT,"
+            " checkpoint BLOB NOT NULL,"
+            " metadata BLOB NOT NULL,"
+            " PRIMARY KEY (thread_id, thread_ts))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._closed = threading.Event()
+        if flush_interval:
+            threading.Thread(target=self._flush_periodically, daemon=True).start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+            self.expire_idle()
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._pending[(thread_id, checkpoint["id"])] = (
+                self.serde.dumps(checkpoint),
+                self.serde.dumps(metadata),
+                config["configurable"].get("thread_ts"),
+                time.time(),
+            )
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+        return {"configurable": {"thread_id": thread_id, "thread_ts": checkpoint["id"]}}
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                [(thread_id, ts, parent, cp, md) for (thread_id, ts), (cp, md, parent, _) in pending.items()],
+            )
+            last_access = {}
+            for (thread_id, _), (_, _, _, accessed) in pending.items():
+                last_access[thread_id] = max(accessed, last_access.get(thread_id, 0.0))
+            self._conn.executemany("INSERT OR REPLACE INTO threads VALUES (?, ?)", list(last_access.items()))
+            # compaction: superseded checkpoints of the threads just written are dropped
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND thread_ts NOT IN "
+                "(SELECT thread_ts FROM checkpoints WHERE thread_id = ? ORDER BY thread_ts DESC LIMIT ?)",
+                [(thread_id, thread_id, self.keep_last) for thread_id in last_access],
+            )
+            self._conn.commit()
+
+    def expire_idle(self, max_idle_seconds: float = None) -> int:
+        cutoff = time.time() - (max_idle_seconds if max_idle_seconds is not None else self.max_idle_seconds)
+        with self._lock:
+            expired = [
+                row[0] for row in self._conn.execute("SELECT thread_id FROM threads WHERE last_access < ?", (cutoff,))
+            ]
+            expired = [thread_id for thread_id in expired if not any(key[0] == thread_id for key in self._pending)]
+            self._conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", [(t,) for t in expired])
+            self._conn.executemany("DELETE FROM threads WHERE thread_id = ?", [(t,) for t in expired])
+            self._conn.commit()
+        return len(expired)
+
+    def _to_tuple(self, thread_id: str, ts: str, checkpoint: bytes, metadata: bytes, parent: str) -> CheckpointTuple:
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "thread_ts": ts}},
+            checkpoint=self.serde.loads(checkpoint),
+            metadata=self.serde.loads(metadata),
+            parent_config={"configurable": {"thread_id": thread_id, "thread_ts": parent}} if parent else None,
+        )
+
+    def _rows(self, thread_id: str = None) -> list[tuple[str, str, bytes, bytes, Optional[str]]]:
+        """Stored and buffered checkpoints, newest first."""
+        query = "SELECT thread_id, thread_ts, checkpoint, metadata, parent_ts FROM checkpoints"
+        params = ()
+        if thread_id is not None:
+            query += " WHERE thread_id = ?"
+            params = (thread_id,)
+        with self._lock:
+            rows = {(row[0], row[1]): row for row in self._conn.execute(query, params)}
+            for (pending_thread, ts), (cp, md, parent, _) in self._pending.items():
+                if thread_id is None or pending_thread == thread_id:
+                    rows[(pending_thread, ts)] = (pending_thread, ts, cp, md, parent)
+        return [rows[key] for key in sorted(rows, key=lambda key: key[1], reverse=True)]
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ts = config["configurable"].get("thread_ts")
+        for row in self._rows(thread_id):
+            if ts is None or row[1] == ts:
+                return self._to_tuple(*row)
+        return None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"] if config else None
+        for row in self._rows(thread_id):
+            if before and row[1] >= before["configurable"]["thread_ts"]:
+                continue
+            checkpoint_tuple = self._to_tuple(*row)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield checkpoint_tuple
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter=None, before=None, limit=None):
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata):
+        return self.put(config, checkpoint, metadata)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,101 @@
+from bisect import bisect_left
+from typing import Callable
+
+from api_chatbot_demo.ai.tokens import count_tokens
+
+
+def serialize_message(message: dict) -> str:
+    return message["role"] + ":\t" + message["content"] + "\n"
+
+
+class ConversationSerializer:
+    """
+    Turns a list of `{"role", "content"}` messages into the transcript sent as the YDC `query` parameter.
+
+    Each message is serialized and token-counted once, when it is first seen. System messages are always sent;
+    the remaining turns are sent newest-first until `token_budget` is reached. Turns that slide out of the window
+    are dropped, or folded into a running summary when a `summarizer` is given.
+    In delta mode only the turns the server has not seen yet (per `mark_synced`) are sent.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 4000,
+        summarizer: Callable[[str], str] = None,
+        token_counter: Callable[[str], int] = count_tokens,
+    ):
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+        self.reset()
+
+    def reset(self):
+        self.system = ""
+        self.system_tokens = 0
+        self.lines: list[str] = []
+        # cumulative token counts, so the window start can be found with a binary search
+        self.cumulative_tokens: list[int] = []
+        self.num_messages = 0
+        self.first_message = None
+        self.summary = ""
+        self.summary_tokens = 0
+        self.num_summarized = 0
+        self.num_synced = 0
+
+    def update(self, messages: list[dict]):
+        """Serialize the messages appended since the last call. A cleared or shortened history starts over."""
+        if len(messages) < self.num_messages or (messages and messages[0] is not self.first_message):
+            self.reset()
+        self.first_message = messages[0] if messages else None
+
+        for message in messages[self.num_messages:]:
+            line = serialize_message(message)
+            if message["role"] == "system":
+                self.system += line
+                self.system_tokens += self.token_counter(line)
+            else:
+                total = self.cumulative_tokens[-1] if self.cumulative_tokens else 0
+                self.lines.append(line)
+                self.cumulative_tokens.append(total + self.token_counter(line))
+        self.num_messages = len(messages)
+
+    def window_start(self, reserved_tokens: int = 0) -> int:
+        """Index of the oldest turn that still fits in the token budget."""
+        if not self.lines:
+            return 0
+        available = self.token_budget - self.system_tokens - self.summary_tokens - reserved_tokens
+        # turns[i:] cost cumulative[-1] - cumulative[i - 1] tokens
+        threshold = self.cumulative_tokens[-1] - available
+        start = bisect_left(self.cumulative_tokens, threshold) + 1 if threshold > 0 else 0
+        # always send at least the latest turn
+        return min(start, len(self.lines) - 1)
+
+    def serialize(self, system: str = None) -> str:
+        """`system` is sent as an extra system message for this request only, e.g. per-question context."""
+        extra = serialize_message({"role": "system", "content": system}) if system else ""
+        reserved_tokens = self.token_counter(extra) if extra else 0
+        start = self.window_start(reserved_tokens)
+        if self.summarizer is not None and start > self.num_summarized:
+            dropped = "".join(self.lines[self.num_summarized:start])
+            self.summary = self.summarizer(self.summary + dropped)
+            self.summary_tokens = self.token_counter(self.summary)
+            self.num_summarized = start
+            # a longer summary may push more turns out of the window; they will be folded in next turn
+            start = max(start, self.window_start(reserved_tokens))
+
+        summary = f"summary of earlier conversation:\t{self.summary}\n" if self.summary else ""
+        return self.system + extra + summary + "".join(self.lines[start:])
+
+    def delta(self, system: str = None) -> str:
+        """Only the turns added since `mark_synced`, or the full transcript if the server holds no context yet."""
+        if not self.num_synced:
+            return self.serialize(system)
+        extra = serialize_message({"role": "system", "content": system}) if system else ""
+        return extra + "".join(self.lines[self.num_synced:])
+
+    def mark_synced(self, include_reply: bool = False):
+        """
+        Record that the server now holds every turn seen so far under the conversation's chat_id.
+        `include_reply` also counts the assistant answer the server just produced but `update` has not seen yet.
+        """
+        self.num_synced = len(self.lines) + int(include_reply)
@@ -1,20 +1,269 @@
+import csv
+import io
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator, Sequence
 
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.document_loaders.csv_loader import CSVLoader
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+
+from api_chatbot_demo.ai.splitters import DEFAULT_CHUNK_SIZES
+from api_chatbot_demo.ai.tokens import count_tokens
+
+
+# one small process pool for every loader, created on first use; spawned rather than forked, since forking the
+# multithreaded server can deadlock the child
+PDF_POOL_WORKERS = min(4, os.cpu_count() or 1)
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+def discard_pdf_pool(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died, so the next PDF gets a new one."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_pdf_pages(file_path: str, start: int, stop: int) -> list[Document]:
+    """Parse pages [start, stop) of a PDF. Runs in a worker process, so it only takes picklable arguments."""
+    import pypdf
+
+    reader = pypdf.PdfReader(file_path)
+    return [
+        Document(page_content=reader.pages[page].extract_text(), metadata={"source": file_path, "page": page})
+        for page in range(start, min(stop, len(reader.pages)))
+    ]
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def format_row(values: Iterable) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(values)
+    return buffer.getvalue()
+
+
+def iter_row_groups(
+    header: list[str], rows: Iterable[Sequence], max_tokens: int, title: str = None
+) -> Iterator[tuple[str, int, int]]:
+    """
+    Group consecutive `rows` into CSV text of at most `max_tokens` (a single longer row is a group of its own),
+    each starting with `title` and the header. Yields (text, first row, last row).
+    """
+    preamble = [title, format_row(header)] if title else [format_row(header)]
+    # one token per line for the newline
+    preamble_tokens = sum(count_tokens(line) + 1 for line in preamble)
+    lines, tokens, first_row = [], preamble_tokens, 0
+    for row_number, row in enumerate(rows):
+        line = format_row(row)
+        line_tokens = count_tokens(line) + 1
+        if lines and tokens + line_tokens > max_tokens:
+            yield "\n".join(preamble + lines), first_row, row_number - 1
+            lines, tokens, first_row = [], preamble_tokens, row_number
+        lines.append(line)
+        tokens += line_tokens
+    if lines:
+        yield "\n".join(preamble + lines), first_row, first_row + len(lines) - 1
+
+
+class RowGroupedCSVLoader(BaseLoader):
+    """
+    Streams a CSV file as documents of consecutive rows, each starting with the header row and at most `max_tokens`
+    long, instead of one document per row. Only `columns` are kept, if given.
+    Rows are read as they are grouped, so memory stays bounded by one group whatever the size of the file.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        columns: list[str] = None,
+        max_tokens: int = DEFAULT_CHUNK_SIZES[".csv"].chunk_size,
+        encoding: str = "utf-8-sig",
+        csv_args: dict = None
+    ):
+        self.file_path = str(file_path)
+        self.columns = columns
+        self.max_tokens = max_tokens
+        self.encoding = encoding
+        self.csv_args = csv_args or {}
+
+    def lazy_load(self) -> Iterator[Document]:
+        with open(self.file_path, newline="", encoding=self.encoding) as f:
+            reader = csv.reader(f, **self.csv_args)
+            header = next(reader, None)
+            if header is None:
+                return
+            indices = range(len(header))
+            if self.columns:
+                missing = [column for column in self.columns if column not in header]
+                if missing:
+                    raise ValueError(f"Columns {missing} not found in {self.file_path}")
+                indices = [header.index(column) for column in self.columns]
+
+            rows = ([row[i] if i < len(row) else "" for i in indices] for row in reader)
+            for text, first_row, last_row in iter_row_groups([header[i] for i in indices], rows, self.max_tokens):
+                yield Document(
+                    page_content=text, metadata={"source": self.file_path, "row": first_row, "last_row": last_row}
+                )
+
+
+def connect_sqlite_read_only(file_path: str) -> sqlite3.Connection:
+    # read-only at the file level, so neither the loader nor the agent can modify an upload
+    uri = Path(file_path).absolute().as_uri() + "?mode=ro"
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+def sqlite_schema(file_path: str) -> list[tuple[str, str, str]]:
+    """(type, name, CREATE statement) of the tables and views of a SQLite database."""
+    with closing(connect_sqlite_read_only(file_path)) as connection:
+        return connection.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        ).fetchall()
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SQLiteLoader(BaseLoader):
+    """
+    Streams the tables of a SQLite database, opened read-only, as documents of consecutive rows that start with
+    the table name and its column names, like `RowGroupedCSVLoader`.
+    Rows are fetched `fetch_size` at a time, so tables of any size are never loaded whole.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        tables: list[str] = None,
+        max_tokens: int = DEFAULT_CHUNK_SIZES[".db"].chunk_size,
+        fetch_size: int = 1000
+    ):
+        self.file_path = str(file_path)
+        self.tables = tables
+        self.max_tokens = max_tokens
+        self.fetch_size = fetch_size
+
+    @staticmethod
+    def format_value(value) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, bytes):
+            return f"<{len(value)} bytes>"
+        return str(value)
+
+    def iter_rows(self, cursor: sqlite3.Cursor) -> Iterator[list[str]]:
+        while rows := cursor.fetchmany(self.fetch_size):
+            for row in rows:
+                yield [self.format_value(value) for value in row]
+
+    def lazy_load(self) -> Iterator[Document]:
+        tables = [name for kind, name, _ in sqlite_schema(self.file_path) if kind == "table"]
+        if self.tables is not None:
+            tables = [name for name in tables if name in self.tables]
+        with closing(connect_sqlite_read_only(self.file_path)) as connection:
+            for table in tables:
+                cursor = connection.execute(f"SELECT * FROM {quote_identifier(table)}")
+                header = [column[0] for column in cursor.description]
+                groups = iter_row_groups(header, self.iter_rows(cursor), self.max_tokens, title=f"Table {table}")
+                for text, first_row, last_row in groups:
+                    yield Document(
+                        page_content=text,
+                        metadata={"source": self.file_path, "table": table, "row": first_row, "last_row": last_row},
+                    )
 
 
 class MultiTypeDataLoader:
     def __init__(self, handlers: dict[str, callable] = {
         '.pdf': PyPDFLoader,
-        '.csv': CSVLoader
-    }):
+        '.csv': RowGroupedCSVLoader,
+        '.db': SQLiteLoader
+    }, pdf_workers: int = None, pdf_pages_per_task: int = 16):
         self.handlers = handlers
+        # pages are parsed in parallel when above 1; bounds the tasks in flight, the pool itself is shared
+        self.pdf_workers = pdf_workers or PDF_POOL_WORKERS
+        self.pdf_pages_per_task = pdf_pages_per_task
 
     def __call__(self, file: str):
-        file_path = Path(file)
+        return list(self.lazy_load(file))
+
+    def get_handler(self, file_path: Path):
         handler = self.handlers.get(file_path.suffix)
-        if handler:
-            return handler(file_path).load()
-        else:
+        if handler is None:
             raise TypeError(f"No handler found for {file_path.suffix} files")
+        return handler
+
+    def lazy_load(self, file: str) -> Iterator[Document]:
+        file_path = Path(file)
+        handler = self.get_handler(file_path)
+        if handler is PyPDFLoader and self.pdf_workers > 1:
+            yield from self.lazy_load_pdf(str(file_path))
+        else:
+            yield from handler(file_path).lazy_load()
+
+    def lazy_load_pdf(self, file_path: str) -> Iterator[Document]:
+        """
+        Parse page ranges of a PDF across the shared process pool and yield the pages in order.
+        At most two tasks per worker are in flight, so parsed pages never pile up ahead of the consumer.
+        """
+        import pypdf
+
+        num_pages = len(pypdf.PdfReader(file_path).pages)
+        ranges = [
+            (start, start + self.pdf_pages_per_task) for start in range(0, num_pages, self.pdf_pages_per_task)
+        ]
+        if len(ranges) < 2:
+            for start, stop in ranges:
+                yield from load_pdf_pages(file_path, start, stop)
+            return
+
+        max_in_flight = 2 * self.pdf_workers
+        pool = get_pdf_pool()
+        pending = []
+        remaining = iter(ranges)
+        try:
+            for start, stop in islice(remaining, max_in_flight):
+                pending.append(pool.submit(load_pdf_pages, file_path, start, stop))
+            while pending:
+                pages = pending.pop(0).result()
+                for start, stop in islice(remaining, 1):
+                    pending.append(pool.submit(load_pdf_pages, file_path, start, stop))
+                yield from pages
+        except BrokenProcessPool:
+            discard_pdf_pool(pool)
+            raise
+        finally:
+            # the consumer may stop early; the pool outlives this file
+            for future in pending:
+                future.cancel()
+
+    def iter_batches(self, files: Iterable[str], batch_size: int = 64) -> Iterator[list[Document]]:
+        """Stream documents from several files in bounded batches, ready to be split and embedded."""
+        for file in files:
+            yield from batched(self.lazy_load(file), batch_size)
@@ -0,0 +1,65 @@
+from api_chatbot_demo.ai.lexical import BM25Index, content_terms
+from api_chatbot_demo.ai.prompts import API_DOCUMENTATION, SYSTEM_PROMPT_FOCUS, SYSTEM_PROMPT_INSTRUCTIONS
+
+
+def split_markdown_sections(text: str) -> list[str]:
+    """
+    Split markdown into one section per heading, ignoring `#` lines inside code fences.
+    Each section is prefixed with its parent headings so it still makes sense on its own.
+    """
+    sections, current, parents = [], [], []
+    in_code = False
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        elif not in_code and line.startswith("#"):
+            if "".join(current).strip():
+                sections.append("".join(current))
+            level = len(line) - len(line.lstrip("#"))
+            parents = [heading for heading in parents if heading[0] < level]
+            current = [heading for _, heading in parents] + [line]
+            parents.append((level, line))
+            continue
+        current.append(line)
+    if "".join(current).strip():
+        sections.append("".join(current))
+    return sections
+
+
+class DocsSectionRetriever:
+    """
+    Indexes the API documentation by section at startup and picks the `k` sections most relevant to a question,
+    so each request carries a fraction of the documentation instead of all of it.
+    A question counts as a hit for `hit_rate` when the best section scores at least `min_score` on its
+    non-stopword terms, i.e. when the documentation has a section about it.
+    """
+
+    def __init__(self, docs: str = API_DOCUMENTATION, k: int = 3, min_score: float = 1.0):
+        self.k = k
+        self.min_score = min_score
+        self.sections = split_markdown_sections(docs)
+        self.index = BM25Index()
+        for i, section in enumerate(self.sections):
+            self.index.add(str(i), section)
+        self.queries = 0
+        self.hits = 0
+
+    def retrieve(self, question: str) -> list[str]:
+        results = self.index.search(question, k=self.k)
+        self.queries += 1
+        self.hits += self.is_hit(question)
+        # keep the documentation's original order so related sections read naturally
+        return [self.sections[i] for i in sorted(int(doc_id) for doc_id, _ in results)]
+
+    def is_hit(self, question: str) -> bool:
+        """Whether some section matches the question's content words well, not just its stopwords."""
+        terms = content_terms(question)
+        best = self.index.search(" ".join(terms), k=1) if terms else []
+        return bool(best) and best[0][1] >= self.min_score
+
+    def build_system_prompt(self, question: str) -> str:
+        return SYSTEM_PROMPT_INSTRUCTIONS + "".join(self.retrieve(question)) + "\n" + SYSTEM_PROMPT_FOCUS
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.queries if self.queries else 0.0
@@ -0,0 +1,251 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from api_chatbot_demo.ai.dataloaders import batched
+from api_chatbot_demo.ai.tokens import count_tokens
+from api_chatbot_demo.tracing import Span, get_tracer
+
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join(".cache", "embeddings.sqlite")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    return f"{type(embeddings).__name__}:{model}" if model else type(embeddings).__name__
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (embedding model, sha256 of the chunk text).
+    Entries are evicted least-recently-used first once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path: str = DEFAULT_EMBEDDING_CACHE_PATH, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for hash_, vector in rows:
+                    found[hash_] = np.frombuffer(vector, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND hash = ?",
+                    [(now, model, hash_) for hash_ in found],
+                )
+                self._conn.commit()
+            self.hits += sum(1 for hash_ in hashes if hash_ in found)
+            self.misses += sum(1 for hash_ in hashes if hash_ not in found)
+        return found
+
+    def set_many(self, model: str, vectors: dict[str, list[float]]):
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (model, hash_, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for hash_, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an `Embeddings` model so document embeddings are served from an `EmbeddingCache` when possible."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or embedding_model_name(embeddings)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model, hashes)
+
+        missing = {}
+        for hash_, text in zip(hashes, texts):
+            if hash_ not in vectors:
+                missing.setdefault(hash_, text)
+        if missing:
+            new_vectors = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self.cache.set_many(self.model, new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[hash_] for hash_ in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(path: str = DEFAULT_EMBEDDING_CACHE_PATH) -> EmbeddingCache:
+    """Process-wide cache shared by every bot, so sessions indexing the same files reuse each other's work."""
+    return EmbeddingCache(path)
+
+
+class RateLimiter:
+    """Spaces calls so that no more than `requests_per_second` start per second, across all threads."""
+
+    def __init__(self, requests_per_second: float = None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class EmbeddingStats:
+    def __init__(self):
+        self.chunks = 0
+        self.tokens = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "batches": self.batches,
+            "seconds": self.seconds,
+            "chunks_per_second": self.chunks_per_second,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+
+class ConcurrentEmbedder:
+    """
+    Embeds a stream of document batches with up to `max_concurrency` requests in flight.
+    Batches are submitted as soon as they are produced, so embedding overlaps with the loading and splitting
+    that produces the next batches. Results are yielded in submission order.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 128,
+        max_concurrency: int = 4,
+        requests_per_second: float = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.stats = EmbeddingStats()
+
+    def _embed_batch(self, texts: list[str], tokens: int, parent: Span = None) -> list[list[float]]:
+        # worker threads do not inherit the caller's current span, so it is passed explicitly
+        with get_tracer().span("embed", parent=parent, texts=len(texts), prompt_tokens=tokens):
+            self.rate_limiter.wait()
+            return self.embeddings.embed_documents(texts)
+
+    def embed_stream(self, doc_batches: Iterable[list[Document]]) -> Iterator[tuple[list[Document], list[list[float]]]]:
+        start = time.perf_counter()
+        parent = get_tracer().current_span()
+        docs = (doc for batch in doc_batches for doc in batch)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            for batch in batched(docs, self.batch_size):
+                texts = [doc.page_content for doc in batch]
+                tokens = sum(count_tokens(text) for text in texts)
+                pending.append((batch, executor.submit(self._embed_batch, texts, tokens, parent)))
+                self.stats.chunks += len(batch)
+                self.stats.tokens += tokens
+                self.stats.batches += 1
+                # keep the number of unconsumed batches bounded while the producer runs ahead
+                while len(pending) > 2 * self.max_concurrency or (pending and pending[0][1].done()):
+                    batch, future = pending.popleft()
+                    yield batch, future.result()
+            while pending:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        self.stats.seconds += time.perf_counter() - start
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.tools import BaseTool
+
+from api_chatbot_demo.tracing import get_tracer
+
+# process-wide; a tool call that times out keeps its thread until it returns
+TOOL_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="agent-tool")
+
+# set while the parent class plans a step, so the tool calls it would run one by one are collected instead
+_deferring = threading.local()
+
+
+class _PendingToolCall:
+    def __init__(self, action: AgentAction):
+        self.action = action
+
+
+class ConcurrentAgentExecutor(AgentExecutor):
+    """
+    `AgentExecutor` that runs the tool calls of one step (e.g. a vector lookup and a web search requested together)
+    concurrently on a thread pool instead of one after another, each limited to its timeout.
+    The async path already gathers a step's tool calls; there the timeouts apply too.
+    `time_saved_s` accumulates the difference between the summed tool durations and the steps' wall time.
+    The counters cover every run of the executor, which may be shared by concurrent requests.
+    """
+
+    default_tool_timeout: float = 60.0
+    # tool name -> seconds
+    tool_timeouts: Dict[str, float] = {}
+    tool_calls: int = 0
+    concurrent_steps: int = 0
+    timeouts: int = 0
+    time_saved_s: float = 0.0
+    _stats_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def record(self, tool_calls: int = 0, concurrent_steps: int = 0, timeouts: int = 0, time_saved_s: float = 0.0):
+        with self._stats_lock:
+            self.tool_calls += tool_calls
+            self.concurrent_steps += concurrent_steps
+            self.timeouts += timeouts
+            self.time_saved_s += time_saved_s
+
+    def tool_timeout(self, tool: str) -> float:
+        return self.tool_timeouts.get(tool, self.default_tool_timeout)
+
+    def timed_out_step(self, action: AgentAction) -> AgentStep:
+        self.record(timeouts=1)
+        return AgentStep(
+            action=action, observation=f"Tool {action.tool} timed out after {self.tool_timeout(action.tool):g}s"
+        )
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        if getattr(_deferring, "active", False):
+            return _PendingToolCall(agent_action)
+        return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        # the parent plans the step and handles parsing errors; only its tool calls are held back
+        steps = super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager)
+        actions = []
+        while True:
+            _deferring.active = True
+            try:
+                step = next(steps, None)
+            finally:
+                _deferring.active = False
+            if step is None:
+                break
+            if isinstance(step, _PendingToolCall):
+                actions.append(step.action)
+            else:
+                yield step
+        if actions:
+            yield from self.perform_concurrently(name_to_tool_map, color_mapping, actions, run_manager)
+
+    def perform_concurrently(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        actions: List[AgentAction],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> List[AgentStep]:
+        def perform(action: AgentAction) -> Tuple[AgentStep, float]:
+            start = time.perf_counter()
+            step = self._perform_agent_action(name_to_tool_map, color_mapping, action, run_manager)
+            return step, time.perf_counter() - start
+
+        with get_tracer().span("agent.tool_calls", tools=len(actions)) as span:
+            start = time.perf_counter()
+            # each call keeps the caller's context, e.g. its current tracing span
+            futures = [TOOL_POOL.submit(contextvars.copy_context().run, perform, action) for action in actions]
+            steps, busy = [], 0.0
+            for action, future in zip(actions, futures):
+                # timeouts count from the dispatch of the step, not from when earlier results came in
+                remaining = self.tool_timeout(action.tool) - (time.perf_counter() - start)
+                try:
+                    step, duration = future.result(timeout=max(remaining, 0))
+                except FutureTimeoutError:
+                    step, duration = self.timed_out_step(action), time.perf_counter() - start
+                steps.append(step)
+                busy += duration
+            wall = time.perf_counter() - start
+            saved = max(busy - wall, 0.0)
+            self.record(tool_calls=len(actions), concurrent_steps=int(len(actions) > 1), time_saved_s=saved)
+            span.set(wall_s=wall, sequential_s=busy, saved_s=saved)
+        return steps
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        self.record(tool_calls=1)
+        try:
+            return await asyncio.wait_for(
+                super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                timeout=self.tool_timeout(agent_action.tool),
+            )
+        except asyncio.TimeoutError:
+            return self.timed_out_step(agent_action)
@@ -0,0 +1,321 @@
+import hashlib
+import time
+from typing import Any, Iterator
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import TextSplitter
+
+from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+from api_chatbot_demo.ai.embeddings import (
+    CachedEmbeddings,
+    ConcurrentEmbedder,
+    EmbeddingCache,
+    EmbeddingStats,
+    get_embedding_cache,
+)
+from api_chatbot_demo.ai.lexical import BM25Index, reciprocal_rank_fusion
+from api_chatbot_demo.ai.splitters import TokenChunker
+from api_chatbot_demo.ai.vector_index import (
+    FLAT_SPEC,
+    build_index,
+    choose_index_spec,
+    index_memory_bytes,
+    measure_recall,
+    needs_rebuild,
+    rebuild_index,
+)
+from api_chatbot_demo.streamlit.utils import UploadedFile
+from api_chatbot_demo.tracing import get_tracer
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileIndexManager:
+    """
+    Keeps a single FAISS store, and a BM25 index over the same chunks, in sync with a set of uploaded files.
+    Tracks which vector ids came from which file so files can be added, replaced or removed in place.
+    Files are added to a flat index; after each sync the index is rebuilt as the kind and storage chosen for the
+    corpus size (see `choose_index_spec`), and `build_report` records its memory and recall against flat search.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        dataloader: MultiTypeDataLoader,
+        text_splitter: TextSplitter,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        requests_per_second: float = None,
+        index_kind: str = "auto",
+        index_storage: str = "auto"
+    ):
+        self.embeddings = embeddings
+        self.dataloader = dataloader
+        self.text_splitter = text_splitter
+        self.batch_size = batch_size
+        self.embedder = ConcurrentEmbedder(
+            embeddings, max_concurrency=max_concurrency, requests_per_second=requests_per_second
+        )
+        self.db: FAISS = None
+        self.index_kind = index_kind
+        self.index_storage = index_storage
+        # `FAISS.from_embeddings` starts every store as a flat float32 index
+        self.index_spec = FLAT_SPEC
+        self.build_report: dict = {}
+        self.lexical = BM25Index()
+        self.file_ids: dict[str, list[str]] = {}
+        self.file_fingerprints: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return self.db.index.ntotal if self.db is not None else 0
+
+    def add_file(self, file: UploadedFile, fingerprint: str = None):
+        if file.name in self.file_ids:
+            self.remove_file(file.name)
+        fingerprint = fingerprint or file.content_hash or file_fingerprint(file.path)
+        for other, other_fingerprint in self.file_fingerprints.items():
+            if other_fingerprint == fingerprint:
+                # the same contents are already indexed under another name: reuse its vectors
+                self.file_ids[file.name] = self.file_ids[other]
+                self.file_fingerprints[file.name] = fingerprint
+                self.label_chunks(fingerprint)
+                return
+        tracer = get_tracer()
+
+        # stream pages through the splitter and the embedder a batch at a time instead of loading the whole file;
+        # the embedder keeps requests in flight while the next pages are being parsed and split
+        ids = []
+        with tracer.span("index.add_file", file=file.name) as span:
+            try:
+                for docs, vectors in self.embedder.embed_stream(self.split_batches(file)):
+                    batch_ids = [f"{fingerprint}:{i}" for i in range(len(ids), len(ids) + len(docs))]
+                    text_embeddings = [(doc.page_content, vector) for doc, vector in zip(docs, vectors)]
+                    metadatas = [doc.metadata for doc in docs]
+
+                    with tracer.span("index.build", chunks=len(docs)):
+                        if self.db is None:
+                            self.db = FAISS.from_embeddings(
+                                text_embeddings, self.embeddings, metadatas=metadatas, ids=batch_ids
+                            )
+                        else:
+                            self.db.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_ids)
+                        ids.extend(batch_ids)
+                        for doc_id, doc in zip(batch_ids, docs):
+                            self.lexical.add(doc_id, doc.page_content)
+            except BaseException:
+                # drop the batches that were already added, so the file is either fully indexed or not at all
+                # and a retry does not collide with its own ids
+                if ids:
+                    for doc_id, doc in zip(ids, self.documents(ids)):
+                        self.lexical.remove(doc_id, doc.page_content)
+                    self.delete_vectors(ids)
+                raise
+            span.set(chunks=len(ids))
+
+        self.file_ids[file.name] = ids
+        self.file_fingerprints[file.name] = fingerprint
+
+    def split_batches(self, file: UploadedFile) -> Iterator[list[Document]]:
+        tracer = get_tracer()
+        batches = self.dataloader.iter_batches([file.path], batch_size=self.batch_size)
+        for batch in tracer.iter("file.load", batches, file=file.name):
+            with tracer.span("file.split", file=file.name) as span:
+                docs = self.text_splitter.split_documents(batch)
+                span.set(chunks=len(docs))
+            for doc in docs:
+                doc.metadata["file_name"] = file.name
+            yield docs
+
+    def remove_file(self, name: str):
+        ids = self.file_ids.pop(name, [])
+        fingerprint = self.file_fingerprints.pop(name, None)
+        # vectors are shared by every name with the same contents
+        if ids and fingerprint not in self.file_fingerprints.values():
+            for doc_id, doc in zip(ids, self.documents(ids)):
+                self.lexical.remove(doc_id, doc.page_content)
+            self.delete_vectors(ids)
+        elif ids:
+            self.label_chunks(fingerprint)
+
+    def label_chunks(self, fingerprint: str):
+        """Set the `file_name` of chunks shared by several names to every name currently uploaded with them."""
+        names = sorted(name for name, other in self.file_fingerprints.items() if other == fingerprint)
+        ids = self.file_ids[names[0]]
+        for doc_id, doc in zip(ids, self.documents(ids)):
+            # replaced rather than updated in place: copies of this index share the document objects
+            self.db.docstore._dict[doc_id] = Document(
+                page_content=doc.page_content, metadata={**doc.metadata, "file_name": ", ".join(names)}
+            )
+
+    def delete_vectors(self, ids: list[str]):
+        if isinstance(self.db.index, faiss.IndexFlat):
+            self.db.delete(ids)
+            return
+        # approximate indexes cannot drop vectors and keep positions dense, so the remaining vectors are re-added
+        # to an index with the same trained parameters
+        removed = set(ids)
+        positions = self.db.index_to_docstore_id
+        keep = [position for position in range(len(positions)) if positions[position] not in removed]
+        vectors = self.db.index.reconstruct_n(0, self.db.index.ntotal)[keep]
+        self.db.index = rebuild_index(self.db.index, self.index_spec, vectors)
+        self.db.index_to_docstore_id = {new: positions[old] for new, old in enumerate(keep)}
+        self.db.docstore.delete(ids)
+
+    def optimize(self):
+        """Rebuild the index as the kind and storage chosen for the current corpus size, if they changed."""
+        if self.db is None or not len(self):
+            return
+        spec = choose_index_spec(len(self), self.db.index.d, self.index_kind, self.index_storage)
+        if needs_rebuild(self.index_spec, spec):
+            with get_tracer().span("index.optimize", index=spec.factory) as span:
+                start = time.perf_counter()
+                # lossy if the current index is quantized; it is then only rebuilt on a change of kind or storage
+                vectors = self.db.index.reconstruct_n(0, len(self))
+                index = build_index(spec, vectors)
+                build_s = time.perf_counter() - start
+                recall = 1.0 if spec == FLAT_SPEC else measure_recall(index, vectors)
+                self.db.index, self.index_spec = index, spec
+                self.build_report = {"build_s": build_s, "recall_at_10": recall}
+                span.set(**self.build_report)
+
+        self.build_report.update(
+            index=self.index_spec.factory,
+            chunks=len(self),
+            index_bytes=index_memory_bytes(self.db.index),
+            flat_index_bytes=len(self) * self.db.index.d * 4,
+        )
+        self.build_report.setdefault("recall_at_10", 1.0)
+
+    def sync(self, files: dict[str, UploadedFile]) -> dict[str, list[str]]:
+        """Add new or changed files and drop removed ones. Unchanged files are not re-loaded or re-embedded."""
+        changes = {"added": [], "removed": [], "unchanged": []}
+        self.embedder.stats = EmbeddingStats()
+
+        with get_tracer().span("index.sync") as span:
+            for name in list(self.file_ids):
+                if name not in files:
+                    self.remove_file(name)
+                    changes["removed"].append(name)
+
+            for name, file in files.items():
+                fingerprint = file.content_hash or file_fingerprint(file.path)
+                if self.file_fingerprints.get(name) == fingerprint:
+                    changes["unchanged"].append(name)
+                else:
+                    self.add_file(file, fingerprint=fingerprint)
+                    changes["added"].append(name)
+
+            if changes["added"] or changes["removed"]:
+                self.optimize()
+                span.set(index=self.index_spec.factory)
+
+            span.set(**{key: len(names) for key, names in changes.items()})
+            if changes["added"]:
+                span.set(**{f"embed_{key}": value for key, value in self.embedder.stats.as_dict().items()})
+        return changes
+
+    def clone(self) -> "FileIndexManager":
+        """Copy of this index that can be synced independently. Documents are shared, vectors are copied."""
+        clone = FileIndexManager(
+            self.embeddings,
+            self.dataloader,
+            self.text_splitter,
+            batch_size=self.batch_size,
+            max_concurrency=self.embedder.max_concurrency,
+            index_kind=self.index_kind,
+            index_storage=self.index_storage,
+        )
+        clone.embedder.rate_limiter = self.embedder.rate_limiter
+        if self.db is not None:
+            clone.db = FAISS(
+                self.embeddings,
+                faiss.clone_index(self.db.index),
+                InMemoryDocstore(dict(self.db.docstore._dict)),
+                dict(self.db.index_to_docstore_id),
+            )
+            clone.index_spec = self.index_spec
+            clone.build_report = dict(self.build_report)
+        clone.lexical = self.lexical.copy()
+        clone.file_ids = {name: list(ids) for name, ids in self.file_ids.items()}
+        clone.file_fingerprints = dict(self.file_fingerprints)
+        return clone
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: vectors plus chunk texts."""
+        if self.db is None:
+            return 0
+        vectors = index_memory_bytes(self.db.index)
+        texts = sum(len(doc.page_content) for doc in self.db.docstore._dict.values())
+        return vectors + texts
+
+    def documents(self, ids: list[str]) -> list[Document]:
+        return [self.db.docstore.search(doc_id) for doc_id in ids]
+
+    def lexical_search(self, query: str, k: int) -> list[str]:
+        return [doc_id for doc_id, _ in self.lexical.search(query, k)]
+
+    def vector_search(self, query: str, k: int) -> list[str]:
+        """Ids of the `k` chunks nearest to `query`. Costs a query embedding."""
+        vector = np.array([self.embeddings.embed_query(query)], dtype=np.float32)
+        if self.db._normalize_L2:
+            faiss.normalize_L2(vector)
+        _, positions = self.db.index.search(vector, k)
+        return [self.db.index_to_docstore_id[position] for position in positions[0] if position != -1]
+
+    def as_retriever(self, **kwargs) -> "HybridRetriever":
+        # the retriever holds a reference to this index, so in-place updates are visible without re-creating it
+        return HybridRetriever(index=self, **kwargs)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks of a `FileIndexManager` by fusing its BM25 and vector rankings with reciprocal rank fusion.
+    In "auto" mode, queries that read as exact-match lookups (identifiers, codes, a couple of keywords) are
+    answered from BM25 alone, without embedding the query. `mode` can also force "hybrid", "lexical" or "vector".
+    A lexical search that finds nothing falls back to hybrid retrieval.
+    """
+
+    index: Any
+    k: int = 4
+    # candidates taken from each ranking before fusion
+    fetch_k: int = 20
+    rrf_k: int = 60
+    mode: str = "auto"
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        if self.index.db is None:
+            return []
+        mode = self.mode
+        if mode == "auto":
+            mode = "lexical" if self.index.lexical.is_lookup(query) else "hybrid"
+
+        ids = []
+        if mode == "lexical":
+            ids = self.index.lexical_search(query, self.k)
+        elif mode == "vector":
+            ids = self.index.vector_search(query, self.k)
+        if not ids and mode != "vector":
+            rankings = [self.index.lexical_search(query, self.fetch_k), self.index.vector_search(query, self.fetch_k)]
+            ids = reciprocal_rank_fusion(rankings, k=self.rrf_k)[:self.k]
+        return self.index.documents(ids)
+
+
+def create_file_index(dataloader: MultiTypeDataLoader, embedding_cache: EmbeddingCache = None) -> FileIndexManager:
+    # chunks are sized in embedding tokens, per file type
+    text_splitter = TokenChunker()
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(), embedding_cache or get_embedding_cache())
+    return FileIndexManager(embeddings, dataloader, text_splitter)
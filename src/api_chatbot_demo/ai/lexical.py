@@ -0,0 +1,110 @@
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# words that are looked up verbatim rather than by meaning: quoted, containing digits or underscores,
+# camelCase, or joined by punctuation (e.g. "INV-0042", "user_id", "getUser", "api.you.com")
+IDENTIFIER_PATTERN = re.compile(r"[\"'`]\S+|\w*\d\w*|\w+_\w+|[a-z]+[A-Z]\w*|\w+[.:/-]\w+")
+
+# words that occur in most questions and sections alike; matching them says nothing about relevance or meaning
+STOPWORDS = frozenset("""
+a about all also am an and any are as at be been but by can could did do does for from get had has have how i if in
+into is it its just like make me more most my need no not of on only or other our out over should so some such tell
+than that the their them then there these they this to too up us use using very want was we were what when where
+which who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def content_terms(text: str) -> list[str]:
+    return [term for term in tokenize(text) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """Small in-memory BM25 inverted index. Documents can be added and removed at any time."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[str, int]] = {}
+        self.doc_lengths: dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str, text: str = None):
+        """Remove a document. Passing its text avoids scanning every posting list."""
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        terms = set(tokenize(text)) if text is not None else list(self.postings)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None and posting.pop(doc_id, None) is not None and not posting:
+                del self.postings[term]
+
+    def copy(self) -> "BM25Index":
+        clone = BM25Index(self.k1, self.b)
+        clone.postings = {term: dict(posting) for term, posting in self.postings.items()}
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone.total_length = self.total_length
+        return clone
+
+    def is_lookup(self, query: str, max_keywords: int = 2) -> bool:
+        """
+        Whether `query` reads as an exact-match lookup this index can answer: at least half of its terms belong to
+        identifiers whose terms are all indexed, or it is just a few keywords that all are. A question that merely
+        mentions an identifier (e.g. a year) is not; hybrid retrieval still ranks exact matches of it highly.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return False
+        identifier_terms = 0
+        for match in IDENTIFIER_PATTERN.finditer(query):
+            match_terms = tokenize(match.group())
+            if all(term in self.postings for term in match_terms):
+                identifier_terms += len(match_terms)
+        if 2 * identifier_terms >= len(terms):
+            return True
+        return len(terms) <= max_keywords and all(term in self.postings for term in terms)
+
+    def search(self, query: str, k: int = 4) -> list[tuple[str, float]]:
+        if not self.doc_lengths:
+            return []
+        num_docs = len(self.doc_lengths)
+        average_length = self.total_length / num_docs
+        scores = Counter()
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, count in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] += idf * count * (self.k1 + 1) / (count + norm)
+        return scores.most_common(k)
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """Merge rankings of ids by the sum of 1 / (k + rank) over the rankings each id appears in."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1 / (k + rank)
+    return [doc_id for doc_id, _ in scores.most_common()]
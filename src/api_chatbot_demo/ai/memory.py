@@ -0,0 +1,124 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+
+from api_chatbot_demo.ai.tokens import count_tokens
+from api_chatbot_demo.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+# summaries are cheap, infrequent LLM calls; one shared worker keeps them off the request path
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+
+
+class SummaryBufferChatHistory(BaseChatMessageHistory):
+    """
+    Chat history bounded by a token budget.
+    When the recent messages exceed `max_token_limit`, the oldest ones are compacted into a running summary
+    by `llm` on a background thread (or simply dropped when no `llm` is given). Until their summary is ready
+    they stay visible, so nothing disappears from the agent context mid-compaction.
+    The same store backs the displayed chat and the context passed to the model.
+    """
+
+    def __init__(
+        self,
+        llm: BaseLanguageModel = None,
+        max_token_limit: int = 2000,
+        token_counter: Callable[[str], int] = count_tokens,
+    ):
+        self.llm = llm
+        self.max_token_limit = max_token_limit
+        self.token_counter = token_counter
+        self.summary = ""
+        self.recent: list[BaseMessage] = []
+        self.recent_tokens: list[int] = []
+        self.compacting: list[BaseMessage] = []
+        self._compaction = None
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        with self._lock:
+            if not self.summary:
+                return self.compacting + self.recent
+            summary = SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")
+            return [summary] + self.compacting + self.recent
+
+    def add_message(self, message: BaseMessage):
+        with self._lock:
+            self.recent.append(message)
+            self.recent_tokens.append(self.token_counter(message.content))
+            if sum(self.recent_tokens) > self.max_token_limit:
+                self._start_compaction()
+
+    def _start_compaction(self):
+        # one compaction at a time; messages arriving meanwhile are handled by the next one
+        if self._compaction is not None and not self._compaction.done():
+            return
+        overflow = []
+        while len(self.recent) > 1 and sum(self.recent_tokens) > self.max_token_limit:
+            overflow.append(self.recent.pop(0))
+            self.recent_tokens.pop(0)
+        if not overflow:
+            return
+        if self.llm is None:
+            return
+        self.compacting = overflow
+        self._compaction = _summary_executor.submit(self._summarize, self.summary, overflow, self._generation)
+
+    def _summarize(self, summary: str, messages: list[BaseMessage], generation: int):
+        tracer = get_tracer()
+        span = tracer.start_span("memory.summarize", messages=len(messages))
+        error = None
+        try:
+            prompt = SUMMARY_PROMPT.format(summary=summary, new_lines=get_buffer_string(messages))
+            new_summary = self.llm.invoke(prompt)
+            new_summary = getattr(new_summary, "content", new_summary)
+        except Exception as e:
+            # keep the old summary; the messages are dropped rather than retried forever
+            logger.exception("chat history summarization failed")
+            error = e
+            new_summary = summary
+        tracer.finish(span, error)
+        with self._lock:
+            if generation != self._generation:
+                # the history was cleared while summarizing
+                return
+            self.summary = new_summary
+            self.compacting = []
+            if sum(self.recent_tokens) > self.max_token_limit:
+                self._compaction = None
+                self._start_compaction()
+
+    def wait(self, timeout: float = None):
+        """Block until any in-flight compaction is finished."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.result(timeout)
+
+    def get_state(self) -> dict:
+        """The running summary and the messages it does not cover yet, e.g. to persist in a checkpoint."""
+        with self._lock:
+            return {"summary": self.summary, "messages": self.compacting + self.recent}
+
+    def set_state(self, state: dict):
+        with self._lock:
+            self.clear()
+            self.summary = state.get("summary", "")
+            for message in state.get("messages", []):
+                self.add_message(message)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.summary = ""
+            self.recent = []
+            self.recent_tokens = []
+            self.compacting = []
@@ -1,8 +1,10 @@
-SYSTEM_PROMPT = """
+SYSTEM_PROMPT_INSTRUCTIONS = """
 You are an engineering assistant bot, trained to help others build applications ontop of You.com's API. I will give you all the information you need through API documentation. 
 
 
-# You.com API Documentation
+"""
+
+API_DOCUMENTATION = """# You.com API Documentation
 Source: https://youdotcom.notion.site/You-com-API-Documentation-62c58f4838934cbfb89601fa00e85e50?pvs=74
 
 We currently offer 2 [You.com](http://You.com) APIs. Smart mode and Research Mode:
@@ -132,5 +134,10 @@ Overall, we've found that Smart Mode API is preferred over WebLLM 77% of the tim
 We can support a range of QPS. For now, if you intend to send more than 100 QPM (Queries Per Minute), please let us know.
 
 
-Focus on ONLY the you.com API and it's implementation
-"""
\ No newline at end of file
+"""
+
+SYSTEM_PROMPT_FOCUS = """Focus on ONLY the you.com API and it's implementation
+"""
+
+# the full prompt inlines the whole documentation; the docs chatbot retrieves only the relevant sections per turn
+SYSTEM_PROMPT = SYSTEM_PROMPT_INSTRUCTIONS + API_DOCUMENTATION + SYSTEM_PROMPT_FOCUS
@@ -0,0 +1,59 @@
+"""
+Entry point of the `PythonWorkerPool` processes, started as `python -m api_chatbot_demo.ai.python_worker <fd> <bytes>`.
+Standard library only, so a worker starts in milliseconds.
+"""
+import builtins
+import os
+import sys
+from io import StringIO
+from multiprocessing.connection import Connection
+
+try:
+    import resource
+except ImportError:  # not available on Windows; workers then run without a memory limit
+    resource = None
+
+READY = "ready"
+
+
+def new_namespace() -> dict:
+    return {"__name__": "__main__", "__builtins__": builtins}
+
+
+def execute(command: str, namespace: dict = None) -> str:
+    """Run `command` in `namespace` (a fresh one by default) and return what it printed, like `PythonREPL.run`."""
+    old_stdout = sys.stdout
+    sys.stdout = output = StringIO()
+    try:
+        exec(command, new_namespace() if namespace is None else namespace)
+        return output.getvalue()
+    except Exception as e:
+        return repr(e)
+    finally:
+        sys.stdout = old_stdout
+
+
+def worker_main(conn, memory_limit_bytes: int = None):
+    # BLAS thread pools reserve a lot of address space, which would eat into RLIMIT_AS
+    os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    if memory_limit_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    conn.send(READY)
+    # kept between commands for as long as the pool sends `fresh=False`, i.e. within a session
+    namespace = new_namespace()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        command, fresh = message
+        if fresh:
+            namespace = new_namespace()
+        conn.send(execute(command, namespace))
+
+
+if __name__ == "__main__":
+    worker_main(Connection(int(sys.argv[1])), int(sys.argv[2]) or None)
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from api_chatbot_demo.ai.cache import SingleFlight
+from api_chatbot_demo.ai.index import FileIndexManager, file_fingerprint
+from api_chatbot_demo.streamlit.utils import UploadedFile
+
+
+def files_fingerprint(files: dict[str, UploadedFile]) -> str:
+    """Identifies a file set by name and content, independent of upload order or local path."""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        fingerprint = files[name].content_hash or file_fingerprint(files[name].path)
+        digest.update(f"{name}\0{fingerprint}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BotRegistry:
+    """
+    Process-wide store of file indexes, shared by every session whose uploaded files have the same contents.
+    Sessions keep their own bot and conversation around a shared index, and must not sync it in place.
+    Indexes are evicted least-recently-used once their combined size exceeds `max_bytes`; sessions still holding
+    an evicted index keep working, it just stops being shared.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        self.max_bytes = max_bytes
+        self.indexes: OrderedDict[str, FileIndexManager] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._builds = SingleFlight()
+
+    def get_index(
+        self,
+        files: dict[str, UploadedFile],
+        create_index: Callable[[], FileIndexManager],
+        base: FileIndexManager = None,
+    ) -> FileIndexManager:
+        """
+        Return the shared index for `files`, building it on a miss. A `base` index (e.g. the session's
+        previous one) is cloned and synced, so only changed files are re-indexed.
+        """
+        key = files_fingerprint(files)
+        with self._lock:
+            index = self.indexes.get(key)
+            if index is not None:
+                self.indexes.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        def build():
+            index = base.clone() if base is not None else create_index()
+            index.sync(files)
+            with self._lock:
+                self.indexes[key] = index
+                self._evict()
+            return index
+
+        # concurrent sessions uploading the same files wait for a single build
+        return self._builds.do(key, build)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(index.memory_bytes() for index in self.indexes.values())
+
+    def _evict(self):
+        total = sum(index.memory_bytes() for index in self.indexes.values())
+        # never evict the most recently used index, even if it alone exceeds the ceiling
+        while total > self.max_bytes and len(self.indexes) > 1:
+            _, index = self.indexes.popitem(last=False)
+            total -= index.memory_bytes()
+
+    def stats(self) -> dict:
+        return {
+            "indexes": len(self.indexes),
+            "memory_bytes": self.memory_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,302 @@
+import atexit
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+from functools import lru_cache
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, BaseCallbackHandler, CallbackManagerForToolRun
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.tools import BaseTool
+from langchain_experimental.utilities.python import PythonREPL
+
+from api_chatbot_demo.ai import python_worker
+from api_chatbot_demo.tracing import get_tracer
+
+
+class _Worker:
+    def __init__(self, memory_limit_bytes: Optional[int]):
+        # a plain subprocess rather than multiprocessing, which would re-import the server's __main__ in every worker
+        parent_socket, child_socket = socket.socketpair()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", python_worker.__name__, str(child_socket.fileno()), str(memory_limit_bytes or 0)],
+            pass_fds=[child_socket.fileno()],
+        )
+        child_socket.close()
+        self.conn = Connection(parent_socket.detach())
+        self.ready = False
+        self.runs = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == python_worker.READY
+        return self.ready
+
+    def stop(self, timeout: float = 1.0):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+
+class _Session:
+    def __init__(self):
+        # held for the duration of each execution, so a session's commands run one at a time and in order
+        self.lock = threading.Lock()
+        self.worker: Optional[_Worker] = None
+        self.last_used = time.monotonic()
+
+
+class PythonWorkerPool:
+    """
+    Runs Python snippets in a pool of pre-started worker processes, so a slow or runaway snippet neither blocks
+    the server process nor other sessions.
+
+    - Every execution starts from a fresh namespace, unless it passes a `session`: the executions of a session share
+      their variables, imports and definitions, like the steps of a `PythonREPLTool`. A session keeps its worker
+      until `end_session`, or until it has been unused for `session_timeout` seconds.
+    - Every execution is given `timeout` seconds; a worker that overruns is killed and replaced, and its session's
+      state is lost.
+    - Workers are limited to `memory_limit_mb` of address space.
+    - Workers are recycled after `max_runs_per_worker` executions, so state leaked by snippets does not pile up.
+    Callers queue for a free worker for up to the execution's timeout, then fail; `stats` reports queue depth and
+    outcome counts. Requires a POSIX system.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = None,
+        timeout: float = 30.0,
+        memory_limit_mb: int = 1024,
+        max_runs_per_worker: int = 50,
+        start_timeout: float = 30.0,
+        session_timeout: float = 600.0,
+    ):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit_bytes = memory_limit_mb * 2**20 if memory_limit_mb else None
+        self.max_runs_per_worker = max_runs_per_worker
+        self.start_timeout = start_timeout
+        self.session_timeout = session_timeout
+
+        self._sessions: dict[str, _Session] = {}
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.waiting = 0
+        self.max_waiting = 0
+        self.executions = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.busy = 0
+        self.recycled = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        workers = [self._start_worker() for _ in range(self.num_workers)]
+        for worker in workers:
+            worker.wait_ready(self.start_timeout)
+            self._idle.put(worker)
+
+    def _start_worker(self) -> _Worker:
+        return _Worker(self.memory_limit_bytes)
+
+    def _acquire(self, timeout: float) -> _Worker:
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no Python worker became free within {timeout:g}s") from None
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def _release(self, worker: _Worker, healthy: bool = True):
+        if self._closed:
+            worker.stop()
+            return
+        if not healthy or worker.runs >= self.max_runs_per_worker:
+            if healthy:
+                with self._lock:
+                    self.recycled += 1
+            worker.stop(timeout=0)
+            worker = self._start_worker()
+        self._idle.put(worker)
+
+    def execute(self, command: str, timeout: float = None, session: str = None) -> str:
+        if self._closed:
+            raise RuntimeError("PythonWorkerPool is closed")
+        self._end_expired_sessions()
+        timeout = timeout or self.timeout
+        if session is None:
+            return self._execute(command, timeout)
+        while True:
+            with self._lock:
+                entry = self._sessions.setdefault(session, _Session())
+            with entry.lock:
+                if self._sessions.get(session) is entry:
+                    return self._execute(command, timeout, entry)
+            # the session was ended while this call waited for it; start a new one
+
+    def _execute(self, command: str, timeout: float, session: _Session = None) -> str:
+        with get_tracer().span("python.exec", command_chars=len(command)) as span:
+            start = time.perf_counter()
+            fresh = session is None or session.worker is None
+            try:
+                # waiting for a worker gets the same `timeout` as the execution, so a busy pool cannot block forever
+                worker = self._acquire(timeout) if fresh else session.worker
+            except TimeoutError as e:
+                with self._lock:
+                    self.busy += 1
+                span.set(wait_s=time.perf_counter() - start, outcome="busy", fresh=fresh)
+                return f"Execution failed: {e}"
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                # a replacement worker may still be starting; that time does not count against `timeout`
+                if not worker.wait_ready(self.start_timeout):
+                    raise OSError("worker did not start")
+                worker.conn.send((command, fresh))
+                worker.runs += 1
+                if worker.conn.poll(timeout):
+                    result = worker.conn.recv()
+                else:
+                    outcome = "timeout"
+                    result = f"Execution timed out after {timeout:g}s"
+            except (EOFError, OSError):
+                # the worker died (or never started), e.g. killed by the OS for exceeding its memory limit
+                outcome = "crash"
+                result = "Execution failed: the Python worker process exited unexpectedly"
+            finally:
+                with self._lock:
+                    self.executions += 1
+                    self.timeouts += outcome == "timeout"
+                    self.crashes += outcome == "crash"
+                    self.wait_seconds += started - start
+                    self.run_seconds += time.perf_counter() - started
+                if session is not None and outcome == "ok":
+                    # kept, with its namespace, for the session's next execution
+                    session.worker = worker
+                    session.last_used = time.monotonic()
+                else:
+                    if session is not None:
+                        session.worker = None
+                    self._release(worker, healthy=outcome == "ok")
+            span.set(wait_s=started - start, outcome=outcome, fresh=fresh)
+        return result
+
+    def end_session(self, session: str):
+        """Return the session's worker to the pool; its next execution starts from a fresh namespace."""
+        with self._lock:
+            entry = self._sessions.get(session)
+        if entry is None:
+            return
+        with entry.lock:
+            with self._lock:
+                if self._sessions.get(session) is entry:
+                    del self._sessions[session]
+            if entry.worker is not None:
+                self._release(entry.worker)
+                entry.worker = None
+
+    def _end_expired_sessions(self):
+        deadline = time.monotonic() - self.session_timeout
+        with self._lock:
+            expired = [session for session, entry in self._sessions.items() if entry.last_used < deadline]
+        for session in expired:
+            self.end_session(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            executions = self.executions
+            return {
+                "workers": self.num_workers,
+                "idle": self._idle.qsize(),
+                "sessions": sum(entry.worker is not None for entry in self._sessions.values()),
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "executions": executions,
+                "timeouts": self.timeouts,
+                "crashes": self.crashes,
+                "busy": self.busy,
+                "recycled": self.recycled,
+                "avg_wait_s": self.wait_seconds / executions if executions else 0.0,
+                "avg_run_s": self.run_seconds / executions if executions else 0.0,
+            }
+
+    def close(self):
+        self._closed = True
+        for session in list(self._sessions):
+            self.end_session(session)
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+@lru_cache(maxsize=None)
+def get_python_worker_pool() -> PythonWorkerPool:
+    """Process-wide pool shared by every session of the Python agent."""
+    pool = PythonWorkerPool()
+    atexit.register(pool.close)
+    return pool
+
+
+class PooledPythonREPLTool(BaseTool):
+    """
+    `PythonREPLTool` that executes in a `PythonWorkerPool`. As with `PythonREPLTool`, the commands of one agent run
+    share their variables: the run is a pool session. Add a `PythonSessionCallbackHandler` to the agent's callbacks
+    to return the run's worker as soon as the run ends, rather than after the pool's `session_timeout`.
+    """
+
+    name: str = "Python_REPL"
+    description: str = (
+        "A Python shell. Use this to execute python commands. "
+        "Input should be a valid python command. "
+        "If you want to see the output of a value, you should print it out "
+        "with `print(...)`. "
+        "Variables, imports and definitions persist between the commands of one task."
+    )
+    pool: Any = None
+    sanitize_input: bool = True
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
+        if self.sanitize_input:
+            query = PythonREPL.sanitize_input(query)
+        # the tool's parent run is the agent run
+        parent_run_id = run_manager.parent_run_id if run_manager is not None else None
+        session = str(parent_run_id) if parent_run_id is not None else None
+        return (self.pool or get_python_worker_pool()).execute(query, session=session)
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
+        return await run_in_executor(None, self._run, query, run_manager)
+
+
+class PythonSessionCallbackHandler(BaseCallbackHandler):
+    """Ends the `PythonWorkerPool` session of an agent run when the run finishes."""
+
+    def __init__(self, pool: PythonWorkerPool = None):
+        self.pool = pool
+
+    def end_session(self, run_id: UUID):
+        (self.pool or get_python_worker_pool()).end_session(str(run_id))
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self.end_session(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self.end_session(run_id)
@@ -0,0 +1,141 @@
+import re
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+from api_chatbot_demo.ai.tokens import CHARS_PER_TOKEN, count_tokens, get_encoding, token_byte_lengths, utf8_offsets
+
+# places a chunk may end, by preference; between words only within sentences longer than a chunk
+PARAGRAPH_BREAKS = re.compile(r"\n[ \t]*\n")
+LINE_BREAKS = re.compile(r"\n")
+# punctuation followed by whitespace, skipping e.g. "3.5" or "api.you.com"
+SENTENCE_ENDS = re.compile(r"[.!?]\s")
+WORD_BREAKS = re.compile(r"\s+")
+WORD_LEVEL, SENTENCE_LEVEL, LINE_LEVEL, PARAGRAPH_LEVEL = range(4)
+TEXT_EDGE = PARAGRAPH_LEVEL + 1
+
+
+class ChunkSize(NamedTuple):
+    chunk_size: int
+    chunk_overlap: int
+
+
+# in tokens; table rows are records of their own, so overlapping them only duplicates rows
+DEFAULT_CHUNK_SIZES = {
+    ".csv": ChunkSize(256, 0),
+    ".db": ChunkSize(256, 0),
+    ".pdf": ChunkSize(256, 32),
+}
+
+
+class TokenChunker(TextSplitter):
+    """
+    Splits text into chunks of at most `chunk_size` tokens of the embedding model's tokenizer, preferring to end
+    chunks at paragraph, line and sentence breaks over word breaks.
+    The text is tokenized once and scanned once over the precomputed boundary offsets; substrings are only cut out
+    for the chunks that are emitted. Documents use the sizes in `chunk_sizes` for the suffix of their `source`.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 32,
+        chunk_sizes: dict[str, ChunkSize] = None,
+        encoding_name: str = "cl100k_base",
+        **kwargs
+    ):
+        super().__init__(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=lambda text: count_tokens(text, encoding_name),
+            **kwargs
+        )
+        self.chunk_sizes = DEFAULT_CHUNK_SIZES if chunk_sizes is None else chunk_sizes
+        self.encoding_name = encoding_name
+
+    def split_text(self, text: str) -> list[str]:
+        return [text[start:end] for start, end in self.spans(text, self._chunk_size, self._chunk_overlap)]
+
+    def split_documents(self, documents: Iterable[Document]) -> list[Document]:
+        chunks = []
+        for doc in documents:
+            default = ChunkSize(self._chunk_size, self._chunk_overlap)
+            size = self.chunk_sizes.get(Path(doc.metadata.get("source", "")).suffix.lower(), default)
+            text = doc.page_content
+            for start, end in self.spans(text, *size):
+                metadata = dict(doc.metadata)
+                if self._add_start_index:
+                    metadata["start_index"] = start
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks
+
+    def token_counter(self, text: str) -> Callable[[list[int]], list[float]]:
+        """Function giving the number of tokens of `text` before each of a sorted list of character offsets."""
+        encoding = get_encoding(self.encoding_name)
+        if encoding is None:
+            return lambda offsets: [offset / CHARS_PER_TOKEN for offset in offsets]
+        # token start offsets in bytes from a per-id length table, without a Python loop over the tokens
+        tokens = np.asarray(encoding.encode(text, disallowed_special=()), dtype=np.int64)
+        token_lengths = token_byte_lengths(self.encoding_name)[tokens]
+        token_starts = np.cumsum(token_lengths) - token_lengths
+        return lambda offsets: np.searchsorted(token_starts, utf8_offsets(text, offsets)).tolist()
+
+    def boundaries(self, text: str, chunk_size: int) -> tuple[list[int], list[int], list[float]]:
+        """Offsets where a chunk may end, their levels and the number of tokens before each."""
+        count = self.token_counter(text)
+        # a position that is several kinds of boundary keeps the most preferred;
+        # a chunk keeps its sentence's punctuation
+        boundary_levels = dict.fromkeys([match.end() - 1 for match in SENTENCE_ENDS.finditer(text)], SENTENCE_LEVEL)
+        boundary_levels.update(dict.fromkeys([match.start() for match in LINE_BREAKS.finditer(text)], LINE_LEVEL))
+        boundary_levels.update(
+            dict.fromkeys([match.start() for match in PARAGRAPH_BREAKS.finditer(text)], PARAGRAPH_LEVEL)
+        )
+        boundary_levels.update({0: TEXT_EDGE, len(text): TEXT_EDGE})
+        offsets = sorted(boundary_levels)
+        levels = [boundary_levels[offset] for offset in offsets]
+        tokens = count(offsets)
+        if all(b - a <= chunk_size for a, b in zip(tokens, tokens[1:])):
+            return offsets, levels, tokens
+
+        # only sentences longer than a chunk also get boundaries between their words
+        refined_offsets, refined_levels = [], []
+        for i in range(len(offsets) - 1):
+            refined_offsets.append(offsets[i])
+            refined_levels.append(levels[i])
+            if tokens[i + 1] - tokens[i] > chunk_size:
+                for match in WORD_BREAKS.finditer(text, offsets[i] + 1, offsets[i + 1]):
+                    refined_offsets.append(match.start())
+                    refined_levels.append(WORD_LEVEL)
+        refined_offsets.append(offsets[-1])
+        refined_levels.append(levels[-1])
+        return refined_offsets, refined_levels, count(refined_offsets)
+
+    def spans(self, text: str, chunk_size: int, chunk_overlap: int) -> Iterator[tuple[int, int]]:
+        """(start, end) character offsets of the chunks of `text`, with surrounding whitespace excluded."""
+        offsets, levels, tokens = self.boundaries(text, chunk_size)
+        last = len(offsets) - 1
+        start = 0
+        while start < last:
+            # the furthest boundary that still fits; a single word longer than a chunk becomes a chunk of its own
+            end = max(bisect_right(tokens, tokens[start] + chunk_size, start + 1) - 1, start + 1)
+            if end < last:
+                # among the boundaries past half a chunk, end at the most preferred one
+                half = bisect_left(tokens, tokens[start] + chunk_size / 2, start + 1, end)
+                end = max(range(half, end + 1), key=lambda i: (levels[i], i))
+
+            chunk_start, chunk_end = offsets[start], offsets[end]
+            while chunk_start < chunk_end and text[chunk_start].isspace():
+                chunk_start += 1
+            while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+                chunk_end -= 1
+            if chunk_start < chunk_end:
+                yield chunk_start, chunk_end
+            if end == last:
+                break
+
+            # step back over at most `chunk_overlap` tokens, always moving forward
+            start = max(bisect_left(tokens, tokens[end] - chunk_overlap, start + 1, end), start + 1)
@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+import numpy as np
+
+# rough characters-per-token ratio for English text, used when the tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base"):
+    """Load a tiktoken encoding, or return None if tiktoken or its BPE files are unavailable (e.g. offline)."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=None)
+def token_byte_lengths(encoding_name: str = "cl100k_base") -> np.ndarray:
+    """UTF-8 byte length of every token id of an encoding (0 for unused ids), built once per process."""
+    encoding = get_encoding(encoding_name)
+    lengths = np.zeros(encoding.max_token_value + 1, dtype=np.int64)
+    for token in range(encoding.max_token_value + 1):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return lengths
+
+
+def utf8_offsets(text: str, offsets: list[int]) -> np.ndarray:
+    """Byte offsets in `text.encode("utf-8")` of a sorted list of character offsets."""
+    if text.isascii():
+        return np.asarray(offsets, dtype=np.int64)
+    # lone surrogates (e.g. from PDFs) are encoded as U+FFFD by tiktoken, which is also 3 bytes
+    code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    char_bytes = 1 + (code_points >= 0x80) + (code_points >= 0x800) + (code_points >= 0x10000)
+    starts = np.concatenate(([0], np.cumsum(char_bytes, dtype=np.int64)))
+    return starts[np.asarray(offsets, dtype=np.int64)]
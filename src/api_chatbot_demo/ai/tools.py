@@ -0,0 +1,76 @@
+import json
+from typing import Any, Dict
+
+from langchain_community.utilities.you import YouSearchAPIWrapper
+from langchain_core.pydantic_v1 import Field
+from langchain_core.tools import Tool
+
+from api_chatbot_demo.ai.cache import SingleFlight, TTLCache
+from api_chatbot_demo.ai.dataloaders import sqlite_schema
+
+# process-wide, so identical searches from different sessions share results
+SEARCH_CACHE = TTLCache(max_entries=256, ttl=600)
+SEARCH_SINGLE_FLIGHT = SingleFlight()
+
+
+class CachedYouSearchAPIWrapper(YouSearchAPIWrapper):
+    """
+    `YouSearchAPIWrapper` whose raw responses are cached with a TTL and a bounded size.
+    Concurrent identical searches are coalesced into a single upstream request.
+    """
+
+    cache: Any = Field(default_factory=lambda: SEARCH_CACHE, exclude=True)
+    single_flight: Any = Field(default_factory=lambda: SEARCH_SINGLE_FLIGHT, exclude=True)
+
+    def _cache_key(self, query: str, **kwargs: Any) -> str:
+        params = self._generate_params(query, **kwargs)
+        return json.dumps([self.endpoint_type, params], sort_keys=True, default=str)
+
+    def raw_results(self, query: str, **kwargs: Any) -> Dict:
+        key = self._cache_key(query, **kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        def fetch():
+            results = super(CachedYouSearchAPIWrapper, self).raw_results(query, **kwargs)
+            self.cache.set(key, results)
+            return results
+
+        return self.single_flight.do(key, fetch)
+
+    async def raw_results_async(self, query: str, **kwargs: Any) -> Dict:
+        key = self._cache_key(query, **kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            results = await super(CachedYouSearchAPIWrapper, self).raw_results_async(query, **kwargs)
+            self.cache.set(key, results)
+            return results
+
+        return await self.single_flight.ado(key, fetch)
+
+
+def create_database_schema_tool(databases: dict[str, str]) -> Tool:
+    """Tool giving the agent the schema of uploaded SQLite databases, given as file name -> path."""
+    # read once; uploads are stored by content, so a path's schema never changes
+    schemas = {
+        name: "\n".join(sql for _, _, sql in sqlite_schema(path) if sql) for name, path in databases.items()
+    }
+
+    def get_schema(file_name: str = "") -> str:
+        if file_name in schemas:
+            return f"{file_name}:\n{schemas[file_name]}"
+        return "\n\n".join(f"{name}:\n{schema}" for name, schema in schemas.items())
+
+    return Tool(
+        name="database_schema",
+        func=get_schema,
+        description=(
+            f"CREATE statements of the tables and views in the uploaded databases {list(schemas)}. "
+            "Input is one of these file names, or an empty string for all of them. "
+            "Use it to learn table and column names before searching their rows in file_database."
+        ),
+    )
@@ -0,0 +1,123 @@
+import math
+from typing import NamedTuple
+
+import faiss
+import numpy as np
+
+# corpus sizes, in chunks, up to which each index kind is chosen automatically
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 100_000
+# product quantizers train 256 centroids per sub-vector; below this many vectors fall back to float16
+PQ_MIN_VECTORS = 1024
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 64
+
+# storage used when `storage="auto"`: exact vectors while brute force is affordable, compressed beyond
+AUTO_STORAGE = {"flat": "float32", "hnsw": "float16", "ivf": "pq"}
+
+
+class IndexSpec(NamedTuple):
+    kind: str
+    storage: str
+    factory: str
+    nlist: int = 0
+
+    @property
+    def nprobe(self) -> int:
+        return max(8, self.nlist // 16)
+
+
+FLAT_SPEC = IndexSpec("flat", "float32", "Flat")
+
+
+def pq_subquantizers(dim: int) -> int:
+    """Sub-quantizers of one byte each for about d/4 dimensions, i.e. 16x smaller than float32, dividing `dim`."""
+    m = max(1, dim // 4)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def choose_index_spec(num_vectors: int, dim: int, kind: str = "auto", storage: str = "auto") -> IndexSpec:
+    """
+    Index for a corpus of `num_vectors`: brute force ("flat") while it is small, a graph ("hnsw") while it fits
+    comfortably in memory and inverted lists ("ivf") beyond. Vectors are stored as float32, float16 or
+    product-quantized ("pq") codes.
+    """
+    if kind == "auto":
+        kind = "flat" if num_vectors < FLAT_MAX_VECTORS else "hnsw" if num_vectors < HNSW_MAX_VECTORS else "ivf"
+    if storage == "auto":
+        storage = AUTO_STORAGE[kind]
+    if storage == "pq" and num_vectors < PQ_MIN_VECTORS:
+        storage = "float16"
+    codec = {"float32": "Flat", "float16": "SQfp16", "pq": f"PQ{pq_subquantizers(dim)}"}[storage]
+
+    if kind == "flat":
+        return IndexSpec(kind, storage, codec)
+    if kind == "hnsw":
+        graph = f"HNSW{HNSW_NEIGHBORS}"
+        return IndexSpec(kind, storage, graph if codec == "Flat" else f"{graph}_{codec}")
+    if kind == "ivf":
+        # about 4 * sqrt(n) lists, with the 39 training points per list k-means wants
+        nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+        return IndexSpec(kind, storage, f"IVF{nlist},{codec}", nlist)
+    raise ValueError(f"Unknown index kind {kind!r}")
+
+
+def needs_rebuild(current: IndexSpec, target: IndexSpec) -> bool:
+    if (current.kind, current.storage) != (target.kind, target.storage):
+        return True
+    # inverted lists are retrained once the corpus has outgrown (or shrunk well below) them
+    return current.kind == "ivf" and not current.nlist / 4 <= target.nlist <= current.nlist * 4
+
+
+def prepare_index(index: faiss.Index, spec: IndexSpec) -> faiss.Index:
+    """Set search parameters, and let inverted-list indexes reconstruct vectors by position."""
+    if spec.kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+    elif spec.kind == "ivf":
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = spec.nprobe
+        ivf.make_direct_map()
+    return index
+
+
+def build_index(spec: IndexSpec, vectors: np.ndarray) -> faiss.Index:
+    index = faiss.index_factory(vectors.shape[1], spec.factory)
+    # polysemous codes only serve Hamming-distance filtering, which is not used, and take most of the training time
+    for part in (faiss.downcast_index(index), faiss.downcast_index(getattr(index, "storage", index))):
+        if hasattr(part, "do_polysemous_training"):
+            part.do_polysemous_training = False
+    index.train(vectors)
+    index.add(vectors)
+    return prepare_index(index, spec)
+
+
+def rebuild_index(index: faiss.Index, spec: IndexSpec, vectors: np.ndarray) -> faiss.Index:
+    """An index with the trained parameters of `index` holding only `vectors`."""
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    rebuilt.add(vectors)
+    return prepare_index(rebuilt, spec)
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Approximate size of the stored vectors, plus graph links or list ids."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        code_size = faiss.downcast_index(index.storage).sa_code_size() + index.hnsw.nb_neighbors(0) * 4
+    elif isinstance(index, faiss.IndexIVF):
+        code_size = index.code_size + 8
+    else:
+        code_size = index.sa_code_size()
+    return index.ntotal * code_size
+
+
+def measure_recall(index: faiss.Index, vectors: np.ndarray, k: int = 10, num_queries: int = 100) -> float:
+    """Mean recall@k of `index` against exact search over `vectors`, using a sample of them as queries."""
+    k = min(k, len(vectors))
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    _, exact = faiss.knn(queries, vectors, k)
+    _, approximate = index.search(queries, k)
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approximate, exact)]))
@@ -0,0 +1,211 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Iterator
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from api_chatbot_demo.tracing import get_tracer
+
+YDC_API_URL = "https://chat-api.you.com"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class SSEEvent:
+    event: str
+    data: str
+
+
+def parse_sse(lines: Iterable[str]) -> Iterator[SSEEvent]:
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield SSEEvent(event, "\n".join(data))
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+    if data:
+        yield SSEEvent(event, "\n".join(data))
+
+
+def retry_delay(attempt: int, backoff_factor: float, retry_after: str = None) -> float:
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return backoff_factor * (2 ** attempt) + random.uniform(0, backoff_factor)
+
+
+class YDCClient:
+    """
+    Client for the You.com Smart and Research endpoints.
+    Keeps a pool of keep-alive connections and retries 429/5xx responses with jittered exponential backoff.
+    One instance is meant to be shared by every session.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = YDC_API_URL,
+        timeout: tuple[float, float] = (5.0, 60.0),
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_maxsize: int = 20,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["x-api-key"] = api_key
+
+    def _get(self, mode: str, params: dict, stream: bool = False) -> requests.Response:
+        response = self.session.get(f"{self.base_url}/{mode}", params=params, timeout=self.timeout, stream=stream)
+        response.raise_for_status()
+        return response
+
+    def answer(self, query: str, mode: str = "smart", chat_id: str = None) -> dict:
+        params = {"query": query, "chat_id": chat_id} if chat_id else {"query": query}
+        with get_tracer().span("ydc.answer", mode=mode, query_chars=len(query)):
+            return self._get(mode, params).json()
+
+    def stream_events(self, query: str, mode: str = "smart", chat_id: str = None) -> Iterator[SSEEvent]:
+        params = {"query": query, "stream": True}
+        if chat_id:
+            params["chat_id"] = chat_id
+        with self._get(mode, params, stream=True) as response:
+            # text/event-stream is always UTF-8; requests would otherwise guess ISO-8859-1 when no charset is sent
+            response.encoding = "utf-8"
+            yield from parse_sse(response.iter_lines(decode_unicode=True))
+
+    def stream_answer(self, query: str, mode: str = "smart", chat_id: str = None) -> Iterator[str]:
+        # not a context-managed span: the consumer may abandon the generator from another context
+        tracer = get_tracer()
+        span = tracer.start_span("ydc.stream", mode=mode, query_chars=len(query))
+        error = None
+        try:
+            for event in self.stream_events(query, mode, chat_id):
+                if event.event == "token":
+                    span.first_token()
+                    # each token event carries one model token
+                    span.add(completion_tokens=1)
+                    yield event.data
+                elif event.event == "error":
+                    raise RuntimeError(f"YDC stream error: {event.data}")
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            tracer.finish(span, error)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncYDCClient:
+    """Async counterpart of `YDCClient`, backed by a pooled `httpx.AsyncClient`."""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = YDC_API_URL,
+        timeout: tuple[float, float] = (5.0, 60.0),
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_maxsize: int = 20,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        connect_timeout, read_timeout = timeout
+        self.client = httpx.AsyncClient(
+            headers={"x-api-key": api_key},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+        )
+
+    async def _send(self, mode: str, params: dict, stream: bool = False) -> httpx.Response:
+        request = self.client.build_request("GET", f"{self.base_url}/{mode}", params=params)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(attempt, self.backoff_factor))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            await response.aclose()
+            await asyncio.sleep(retry_delay(attempt, self.backoff_factor, response.headers.get("retry-after")))
+        if response.is_error:
+            await response.aread()
+            response.raise_for_status()
+        return response
+
+    async def answer(self, query: str, mode: str = "smart", chat_id: str = None) -> dict:
+        params = {"query": query, "chat_id": chat_id} if chat_id else {"query": query}
+        with get_tracer().span("ydc.answer", mode=mode, query_chars=len(query)):
+            return (await self._send(mode, params)).json()
+
+    async def stream_events(self, query: str, mode: str = "smart", chat_id: str = None) -> AsyncIterator[SSEEvent]:
+        params = {"query": query, "stream": True}
+        if chat_id:
+            params["chat_id"] = chat_id
+        response = await self._send(mode, params, stream=True)
+        try:
+            lines = []
+            async for line in response.aiter_lines():
+                lines.append(line)
+                if not line:
+                    for event in parse_sse(lines):
+                        yield event
+                    lines = []
+            for event in parse_sse(lines):
+                yield event
+        finally:
+            await response.aclose()
+
+    async def stream_answer(self, query: str, mode: str = "smart", chat_id: str = None) -> AsyncIterator[str]:
+        tracer = get_tracer()
+        span = tracer.start_span("ydc.stream", mode=mode, query_chars=len(query))
+        error = None
+        try:
+            async for event in self.stream_events(query, mode, chat_id):
+                if event.event == "token":
+                    span.first_token()
+                    span.add(completion_tokens=1)
+                    yield event.data
+                elif event.event == "error":
+                    raise RuntimeError(f"YDC stream error: {event.data}")
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            tracer.finish(span, error)
+
+    async def aclose(self):
+        await self.client.aclose()
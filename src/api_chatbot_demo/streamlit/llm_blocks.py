@@ -6,27 +6,51 @@ from itertools import zip_longest
 import matplotlib.pyplot as plt
 import streamlit as st
 from langchain.chains import ConversationChain
-from langchain.memory.chat_message_histories.in_memory import ChatMessageHistory
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_core.chat_history import BaseChatMessageHistory
 from streamlit_chat import message
 
 from api_chatbot_demo.ai.agents import ChatBot
 from api_chatbot_demo.streamlit.utils import (
+    AnsiHTMLRenderer,
     UploadedFile,
-    catchtime,
+    get_upload_store,
+    iter_over_async,
+    iter_stdout,
     redirect_stdout_copy,
     render_stdout,
+    stdout_to_html,
 )
+from api_chatbot_demo.tracing import get_tracer
 
 
 def save_stdout_to_state(name: str, func: callable, *args, **kwargs):
-    with st.spinner(f"running {name}..."):
-        with catchtime() as t:
-            with io.StringIO() as buf, redirect_stdout_copy(buf):
-                func(*args, **kwargs)
-                st.session_state[name] = buf.getvalue()
-        if t() > 0.05:
-            print(f"{name} took {t():.2f}s")
+    with st.spinner(f"running {name}..."), get_tracer().span("block.run", block=name):
+        with io.StringIO() as buf, redirect_stdout_copy(buf):
+            func(*args, **kwargs)
+            st.session_state[name] = buf.getvalue()
+    st.session_state.pop(f"{name}_html", None)
+
+
+def stream_stdout_to_state(name: str, func: callable, *args, **kwargs):
+    """
+    Like `save_stdout_to_state`, but shows the output live while `func` runs. Output arrives in coalesced chunks;
+    only the new text of each chunk is converted to HTML, and the finished HTML is kept for later reruns.
+    """
+    renderer = AnsiHTMLRenderer()
+    output = []
+    placeholder = st.empty()
+    with get_tracer().span("block.run", block=name, streamed=True):
+        try:
+            for chunk in iter_stdout(func, *args, **kwargs):
+                output.append(chunk)
+                renderer.feed(chunk)
+                with placeholder.container():
+                    render_stdout(html=renderer.html())
+        finally:
+            placeholder.empty()
+            st.session_state[name] = "".join(output)
+            st.session_state[f"{name}_html"] = renderer.html()
 
 
 def build_message_list():
@@ -64,61 +88,138 @@ def generate_response(chatbot: ConversationChain):
     return ai_response.content
 
 
-def llm_stdout_st_block(name, func: callable, *args, **kwargs):
+def llm_stdout_st_block(name, func: callable, *args, stream: bool = True, **kwargs):
     name_var = name.lower().replace(" ", "_")
     std_out_var = f"{name_var}_std_output"
     st.header(f"{name}")
     input_text = st.text_area("Agent Input", key=f"{name_var}_input_text")
     button = st.button(f"Send to {name}", key=f"{name_var}_run_button")
     if button:
-        print(f"{name} input:\n{input_text}")
-        save_stdout_to_state(std_out_var, func, input_text, *args, **kwargs)
+        if stream:
+            stream_stdout_to_state(std_out_var, func, input_text, *args, **kwargs)
+        else:
+            save_stdout_to_state(std_out_var, func, input_text, *args, **kwargs)
     else:
         pass
     if std_out_var in st.session_state:
         with st.expander(f"{name} Response", expanded=True):
-            render_stdout(st.session_state[std_out_var])
+            html_var = f"{std_out_var}_html"
+            if html_var not in st.session_state:
+                # converted once per run, not on every rerun
+                st.session_state[html_var] = stdout_to_html(st.session_state[std_out_var])
+            render_stdout(html=st.session_state[html_var])
 
 
-def chat_memory_st_block(chat_memory: ChatMessageHistory):
-    for i, _message in enumerate(chat_memory.messages):
-        if isinstance(_message, HumanMessage):
-            # message(_message.content, is_user=True, key=str(i) + "_user")
-            with st.chat_message("user"):
-                st.markdown(_message.content)
+CHAT_WINDOW = 20
+CHAT_PAGE_SIZE = 50
+CHAT_ROLE_LABELS = {"user": "🧑 **You**", "assistant": "🤖 **Assistant**"}
+
+
+def chat_page_markdown(key: str, messages: list[tuple[str, str]], start: int, stop: int) -> str:
+    """
+    Markdown for `messages[start:stop]` as one block, cached in the session.
+    The page is keyed by its contents, so it is rebuilt only when it gains messages or the history is replaced,
+    e.g. by a new chat that starts with the same greeting.
+    """
+    cache = st.session_state.setdefault(f"{key}_page_cache", {})
+    cache_key = (start, stop, hash(tuple(messages[start:stop])))
+    if cache_key not in cache:
+        # drop stale versions of this page, e.g. the previous, shorter version of the last page
+        for stale in [k for k in cache if k[0] == start]:
+            del cache[stale]
+        cache[cache_key] = "\n\n---\n\n".join(
+            f"{CHAT_ROLE_LABELS.get(role, role)}\n\n{content}" for role, content in messages[start:stop]
+        )
+    return cache[cache_key]
+
+
+def clear_chat_page_cache(key: str = "chat"):
+    """Drop the pages rendered by `chat_messages_st_block`; call it when the history is reset or replaced."""
+    st.session_state.pop(f"{key}_page_cache", None)
+
 
+def chat_messages_st_block(
+    messages: list[tuple[str, str]],
+    key: str = "chat",
+    window: int = CHAT_WINDOW,
+    page_size: int = CHAT_PAGE_SIZE,
+):
+    """
+    Render `(role, content)` messages. Only the last `window` messages get their own chat bubble; older ones
+    are collapsed into paginated, pre-rendered markdown, so a rerun costs the same however long the session is.
+    """
+    older = len(messages) - window
+    # a toggle rather than an expander: the block is often rendered inside one, and expanders cannot be nested
+    if older > 0 and st.toggle(f"Show earlier messages ({older})", key=f"{key}_show_older"):
+        pages = (older + page_size - 1) // page_size
+        page = pages - 1
+        if pages > 1:
+            page = st.number_input("Page", min_value=1, max_value=pages, value=pages, key=f"{key}_page") - 1
+        start = page * page_size
+        with st.container(border=True):
+            st.markdown(chat_page_markdown(key, messages, start, min(start + page_size, older)))
+
+    for role, content in messages[max(older, 0):]:
+        with st.chat_message(role):
+            st.markdown(content)
+
+
+def chat_memory_st_block(chat_memory: BaseChatMessageHistory, key: str = "chat"):
+    messages = []
+    for _message in chat_memory.messages:
+        if isinstance(_message, HumanMessage):
+            messages.append(("user", _message.content))
         elif isinstance(_message, AIMessage):
-            # message(_message.content, key=str(i))
-            with st.chat_message("assistant"):
-                st.markdown(_message.content)
+            messages.append(("assistant", _message.content))
+    chat_messages_st_block(messages, key=key)
 
 
 def llm_conversation_chain_st_block(name, chatbot: ConversationChain):
     st.header(f"{name}")
 
     if user_input := st.chat_input("Send to chatbot"):
-        print(f"{name} input:\n{user_input}")
-        output = chatbot.run(user_input)
-        print(f"{name} output:\n{output}")
+        tracer = get_tracer()
+        with tracer.span("chat.turn", block=name, input_chars=len(user_input)) as span:
+            output = chatbot.run(user_input, callbacks=tracer.callbacks())
+            span.set(output_chars=len(output))
 
     if len(chatbot.memory.chat_memory.messages) > 0:
         with st.expander(f"{name} Response", expanded=True):
             chat_memory_st_block(chatbot.memory.chat_memory)
 
 
+def stream_chatbot_answer(chatbot: ChatBot, user_input: str, status):
+    """Yield answer tokens for `st.write_stream`, reporting tool calls in the given `st.status` container."""
+    for event in iter_over_async(chatbot.astream(user_input)):
+        if event["event"] == "token":
+            yield event["data"]
+        elif event["event"] == "tool_start":
+            status.update(label=f"Calling {event['name']}...", state="running")
+            status.write(f"`{event['name']}`: {event['data']}")
+        elif event["event"] == "tool_end":
+            status.update(label=f"{event['name']} done")
+    status.update(label="Done", state="complete")
+
+
 def llm_chatbot_st_block(name, chatbot: ChatBot):
     st.header(f"{name}")
 
-    if user_input := st.chat_input("Send to chatbot"):
-        print(f"{name} input:\n{user_input}")
-        output = chatbot.run(user_input)
-        print(f"{name} output:\n{output}")
+    user_input = st.chat_input("Send to chatbot")
 
     chat_history = chatbot.get_chat_history()
-    if len(chat_history.messages) > 0:
+    if len(chat_history.messages) > 0 or user_input:
         with st.expander(f"{name} Response", expanded=True):
             chat_memory_st_block(chat_history)
 
+            if user_input:
+                with get_tracer().span("chat.turn", block=name, input_chars=len(user_input)) as span:
+                    with st.chat_message("user"):
+                        st.markdown(user_input)
+                    with st.chat_message("assistant"):
+                        status = st.status("Thinking...")
+                        output = st.write_stream(stream_chatbot_answer(chatbot, user_input, status))
+                    span.set(output_chars=len(output))
+
 
 def llm_system_prompt_block():
     st.header(f"System Prompt")
@@ -142,29 +243,36 @@ def llm_system_prompt_block():
 def file_upload_st_block():
     if 'uploaded_files' not in st.session_state:
         st.session_state.uploaded_files = {}
+        # name -> id of the uploader's file it was stored from, to recognise reruns
+        st.session_state.uploaded_file_ids = {}
 
     st.header("File Upload Example")
 
     description = st.text_input("File Description", key=f"uploaded_file_description")
     uploaded_file = st.file_uploader("Choose a file", type=["pdf", "csv", "db"])
     if uploaded_file is not None and description is not None:
-        if uploaded_file.name in st.session_state.uploaded_files:
-            st.warning(f"File with name {uploaded_file.name} already uploaded. Replacing")
-
-        if not os.path.exists('.uploads'):
-            os.makedirs('.uploads')
-        filepath = os.path.join('.uploads', uploaded_file.name)
-
-        # Save the uploaded file to the session state
-        st.session_state.uploaded_files[uploaded_file.name] = UploadedFile(
-            name=uploaded_file.name, path=filepath, description=description
-        )
-
-        # Save the file to an 'uploads' directory
-        with open(filepath, 'wb') as f:
-            f.write(uploaded_file.getbuffer())
-
-        st.success(f"File '{uploaded_file.name}' uploaded successfully!")
+        previous = st.session_state.uploaded_files.get(uploaded_file.name)
+        if st.session_state.uploaded_file_ids.get(uploaded_file.name) == uploaded_file.file_id:
+            # a rerun while the uploader still holds the same file: it is already stored
+            if previous.description != description:
+                st.session_state.uploaded_files[uploaded_file.name] = UploadedFile(
+                    name=previous.name, path=previous.path, description=description,
+                    content_hash=previous.content_hash
+                )
+        else:
+            store = get_upload_store()
+            # streamed to disk in chunks under its content hash; identical contents are stored once
+            file = store.save(uploaded_file, uploaded_file.name)
+            file.description = description
+            if previous is not None:
+                st.warning(f"File with name {uploaded_file.name} already uploaded. Replacing")
+                # released after saving: re-uploading the same contents only drops the extra reference,
+                # instead of deleting the stored file and writing it again
+                store.release(previous.path)
+            st.session_state.uploaded_files[uploaded_file.name] = file
+            st.session_state.uploaded_file_ids[uploaded_file.name] = uploaded_file.file_id
+
+            st.success(f"File '{uploaded_file.name}' uploaded successfully!")
 
     # Display Uploaded Files
     st.header("Uploaded Files")
@@ -1,21 +1,97 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import queue
+import re
 import sys
+import tempfile
+import threading
+import time
 from contextlib import contextmanager
-from time import perf_counter
+from typing import AsyncIterator, BinaryIO, Iterator
 import json
 
-import requests
 import streamlit.components.v1 as components
 import streamlit as st
 from ansi2html import Ansi2HTMLConverter
-import sseclient
 
+from api_chatbot_demo.ai.cache import SemanticResponseCache
+from api_chatbot_demo.ai.conversation import ConversationSerializer
+from api_chatbot_demo.ai.ydc import YDC_API_URL, YDCClient
 
 
 class UploadedFile:
-    def __init__(self, name, path, description=None):
+    def __init__(self, name, path, description=None, content_hash=None):
         self.name = name
         self.path = path
         self.description = description
+        # sha256 of the contents, when known; indexing uses it instead of re-reading the file
+        self.content_hash = content_hash
+
+
+class UploadStore:
+    """
+    Content-addressed storage for uploads: each distinct content is written once, to `<root>/<sha256><ext>`,
+    however many names or sessions it is uploaded under. Stored files are reference counted and deleted once
+    no upload refers to them.
+    """
+
+    def __init__(self, root: str = ".uploads", chunk_size: int = 1 << 20):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.refcounts: dict[str, int] = {}
+        self.writes = 0
+        self.skipped_writes = 0
+        self._lock = threading.Lock()
+
+    def _chunks(self, stream: BinaryIO) -> Iterator[bytes]:
+        while chunk := stream.read(self.chunk_size):
+            yield chunk
+
+    def save(self, stream: BinaryIO, name: str) -> UploadedFile:
+        """Store the contents of a seekable `stream` uploaded as `name`, taking a reference on the stored file."""
+        stream.seek(0)
+        digest = hashlib.sha256()
+        for chunk in self._chunks(stream):
+            digest.update(chunk)
+        content_hash = digest.hexdigest()
+        # keep the extension, the data loaders dispatch on it
+        path = os.path.join(self.root, content_hash + os.path.splitext(name)[1])
+
+        with self._lock:
+            if os.path.exists(path):
+                self.skipped_writes += 1
+            else:
+                self._write(stream, path)
+                self.writes += 1
+            self.refcounts[path] = self.refcounts.get(path, 0) + 1
+        return UploadedFile(name=name, path=path, content_hash=content_hash)
+
+    def _write(self, stream: BinaryIO, path: str):
+        os.makedirs(self.root, exist_ok=True)
+        stream.seek(0)
+        # write to a temporary file and rename, so a partial write is never mistaken for a stored file
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in self._chunks(stream):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def release(self, path: str):
+        """Drop a reference taken by `save`; the file is deleted with its last reference."""
+        with self._lock:
+            count = self.refcounts.get(path, 0) - 1
+            if count > 0:
+                self.refcounts[path] = count
+                return
+            self.refcounts.pop(path, None)
+            if os.path.exists(path):
+                os.remove(path)
 
 
 class TeeStream:
@@ -42,49 +118,244 @@ def redirect_stdout_copy(new_target):
         sys.stdout = old_target  # restore to the previous value
 
 
+class StdoutRouter:
+    """
+    Installed once as `sys.stdout`: writes go to the real stdout, and writes made by a thread registered with
+    `route_thread_stdout` are also copied to that thread's target. Unlike swapping `sys.stdout`, output of
+    other threads (e.g. other sessions) is not captured.
+    """
+
+    def __init__(self, original_stream):
+        self.original_stream = original_stream
+        self.targets = {}
+
+    def write(self, text):
+        self.original_stream.write(text)
+        target = self.targets.get(threading.get_ident())
+        if target is not None:
+            target.write(text)
+
+    def flush(self):
+        self.original_stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original_stream, name)
+
+
+_router_lock = threading.Lock()
+
+
 @contextmanager
-def catchtime() -> float:
-    start = perf_counter()
-    yield lambda: perf_counter() - start
+def route_thread_stdout(target):
+    with _router_lock:
+        if not isinstance(sys.stdout, StdoutRouter):
+            sys.stdout = StdoutRouter(sys.stdout)
+        router = sys.stdout
+    router.targets[threading.get_ident()] = target
+    try:
+        yield
+    finally:
+        router.targets.pop(threading.get_ident(), None)
+
+
+class _QueueWriter:
+    def __init__(self, items: queue.Queue):
+        self.items = items
+
+    def write(self, text):
+        if text:
+            self.items.put(text)
+
+    def flush(self):
+        pass
 
 
-def render_stdout(std_out: str):
-    ansi_converter = Ansi2HTMLConverter()
-    html_output = ansi_converter.convert(std_out)
-    components.html(html_output, height=600, scrolling=True)
+def iter_stdout(func: callable, *args, flush_interval: float = 0.2, **kwargs) -> Iterator[str]:
+    """
+    Run `func` on a worker thread and yield what it prints while it runs, coalesced into at most one chunk
+    per `flush_interval` seconds. Exceptions raised by `func` are re-raised once its output has been yielded.
+    """
+    items = queue.Queue()
+    done = object()
+    errors = []
 
+    def run():
+        try:
+            with route_thread_stdout(_QueueWriter(items)):
+                func(*args, **kwargs)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            items.put(done)
 
-ydc_api_key = st.secrets["YDC_API_KEY"]
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), daemon=True).start()
+    finished = False
+    while not finished:
+        chunks = [items.get()]
+        deadline = time.monotonic() + flush_interval
+        while chunks[-1] is not done and (remaining := deadline - time.monotonic()) > 0:
+            try:
+                chunks.append(items.get(timeout=remaining))
+            except queue.Empty:
+                break
+        if chunks[-1] is done:
+            finished = True
+            chunks.pop()
+        if chunks:
+            yield "".join(chunks)
+    if errors:
+        raise errors[0]
 
-def build_prompt():
-    prompt = ""
-    for msg in st.session_state.messages:
-        prompt += msg["role"] + ":\t" + msg["content"] + "\n"
-    return prompt
+
+# an escape sequence cut off at the end of a chunk, and complete SGR (colour/style) sequences
+_PARTIAL_ESCAPE = re.compile(r"\x1b(\[[0-9;]*)?$")
+_SGR = re.compile(r"\x1b\[([0-9;]*)m")
+
+
+class AnsiHTMLRenderer:
+    """
+    Converts terminal output to HTML incrementally: each `feed` converts only the new text with one reused
+    `Ansi2HTMLConverter`. Styles left open by a chunk and escape sequences split across chunks carry over.
+    """
+
+    def __init__(self):
+        self.converter = Ansi2HTMLConverter()
+        self.headers = self.converter.produce_headers()
+        self.parts: list[str] = []
+        self.active_styles: list[str] = []
+        self.pending = ""
+
+    def feed(self, text: str) -> str:
+        text = self.pending + text
+        partial = _PARTIAL_ESCAPE.search(text)
+        self.pending = partial.group(0) if partial else ""
+        if partial:
+            text = text[:partial.start()]
+        fragment = self.converter.convert("".join(self.active_styles) + text, full=False)
+        for match in _SGR.finditer(text):
+            if match.group(1) in ("", "0"):
+                self.active_styles = []
+            else:
+                self.active_styles.append(match.group(0))
+        self.parts.append(fragment)
+        return fragment
+
+    def html(self) -> str:
+        return (
+            f"<html><head>{self.headers}</head><body class=\"body_foreground body_background\">"
+            f"<pre class=\"ansi2html-content\">{''.join(self.parts)}</pre></body></html>"
+        )
+
+
+def stdout_to_html(std_out: str) -> str:
+    renderer = AnsiHTMLRenderer()
+    renderer.feed(std_out)
+    return renderer.html()
+
+
+class _AsyncIteratorError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def iter_over_async(async_iterator: AsyncIterator) -> Iterator:
+    """
+    Consume an async iterator from synchronous code (e.g. `st.write_stream`).
+    The iterator runs on its own event loop in a background thread and items are handed over as they arrive.
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def consume():
+        try:
+            async for item in async_iterator:
+                items.put(item)
+        except BaseException as e:
+            items.put(_AsyncIteratorError(e))
+        finally:
+            items.put(done)
+
+    # run in a copy of the caller's context so the current tracing span carries over to the iterator
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(asyncio.run, consume()), daemon=True).start()
+    while (item := items.get()) is not done:
+        if isinstance(item, _AsyncIteratorError):
+            raise item.error
+        yield item
+
+
+def render_stdout(std_out: str = None, html: str = None):
+    """Show terminal output; pass `html` from an `AnsiHTMLRenderer` to skip converting it again."""
+    components.html(html if html is not None else stdout_to_html(std_out), height=600, scrolling=True)
+
+
+def get_ydc_api_key() -> str:
+    # read lazily so importing this module does not require streamlit secrets to be configured
+    return os.environ.get("YDC_API_KEY") or st.secrets["YDC_API_KEY"]
+
+
+def get_conversation() -> ConversationSerializer:
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = ConversationSerializer()
+    return st.session_state.conversation
+
+
+def build_prompt(delta=False, system=None):
+    # only messages added since the previous turn are serialized; older turns come from the cache
+    conversation = get_conversation()
+    conversation.update(st.session_state.messages)
+    return conversation.delta(system) if delta else conversation.serialize(system)
+
+
+@st.cache_resource
+def get_ydc_client() -> YDCClient:
+    # shared by every session so connections to chat-api.you.com stay pooled and alive between turns
+    return YDCClient(get_ydc_api_key(), base_url=os.environ.get("YDC_API_URL", YDC_API_URL))
 
 
 def get_ydc_answer(messages, mode='smart', stream=False):
     query = build_prompt()
-    headers = {'x-api-key': ydc_api_key}
-    endpoint = f"https://chat-api.you.com/{mode}" # use /research for Research mode
-    params = {"query":query, "chat_id": st.session_state.chat_id}
-    response = requests.get(endpoint, params=params, headers=headers)
-    return response.json()
+    return get_ydc_client().answer(query, mode=mode, chat_id=st.session_state.chat_id)
 
-def get_ydc_stream_answer(mode='smart'):
-    query = build_prompt()
-    headers = {'x-api-key': ydc_api_key}
-    endpoint = f"https://chat-api.you.com/{mode}" # use /research for Research mode
-    params = {"query": query, "chat_id": st.session_state.chat_id, "stream": True}
-    response = requests.get(endpoint, params=params, headers=headers, stream=True)
-    client = sseclient.SSEClient(response)
-    full_answer = ''
-    for event in client.events():
-        if event.event == "token":
-            full_answer += event.data
-            yield str(event.data)
-    return full_answer
+
+@st.cache_resource
+def get_upload_store() -> UploadStore:
+    # shared by every session, so a file uploaded in several sessions is stored once
+    return UploadStore()
+
+
+@st.cache_resource
+def get_response_cache() -> SemanticResponseCache:
+    # shared by every session: most docs-chat traffic is the same handful of opening questions
+    return SemanticResponseCache()
 
 
+def get_ydc_stream_answer(mode='smart', delta=False, system=None, use_cache=True):
+    """
+    Stream the answer for the conversation in `st.session_state.messages`.
+    With `delta=True`, turns the server already holds under `st.session_state.chat_id` are not re-sent.
+    `system` is sent as a system message with this turn only.
+    Answers to opening questions are served from the shared response cache when a similar question was seen.
+    """
+    query = build_prompt(delta=delta, system=system)
 
+    # only an opening question does not depend on earlier turns, so only its answer can be reused
+    user_messages = [msg["content"] for msg in st.session_state.messages if msg["role"] == "user"]
+    cacheable = use_cache and len(user_messages) == 1
+    if cacheable:
+        cached_tokens = get_response_cache().lookup(user_messages[0], namespace=mode)
+        if cached_tokens is not None:
+            # the server never sees this turn, so the conversation stays unsynced and the next turn sends it
+            yield from cached_tokens
+            return ''.join(cached_tokens)
 
+    tokens = []
+    for token in get_ydc_client().stream_answer(query, mode=mode, chat_id=st.session_state.chat_id):
+        tokens.append(token)
+        yield token
+    # the server now holds everything up to and including this answer, which the caller appends to the messages
+    get_conversation().mark_synced(include_reply=True)
+    if cacheable:
+        get_response_cache().store(user_messages[0], tokens, namespace=mode)
+    return ''.join(tokens)
@@ -0,0 +1,407 @@
+"""
+Lightweight tracing for the chat pipeline: nested, timed spans with attributes (token counts, time to first token)
+handed to pluggable exporters. Disabled by default; while disabled, spans are a shared no-op object.
+
+Enable it with `configure_tracing(...)`, or through the environment:
+
+- `TRACING_EXPORTERS`: comma-separated list of `json` and `prometheus`
+- `TRACING_JSON_PATH`: file the JSON exporter appends to (default: stderr)
+- `TRACING_PROMETHEUS_PORT`: port serving `/metrics` (default: 9464)
+"""
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from api_chatbot_demo.ai.tokens import count_tokens
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(8)
+        self.span_id = secrets.token_hex(4)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes or {}
+        self.error = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def first_token(self):
+        """Record the time to first token; later calls are ignored."""
+        if "ttft_s" not in self.attributes:
+            self.attributes["ttft_s"] = time.perf_counter() - self._start
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_time,
+            "duration_s": self.duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    name = None
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, **counts):
+        pass
+
+    def first_token(self):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class JSONLogExporter(SpanExporter):
+    """Writes one JSON object per finished span."""
+
+    def __init__(self, path: str = None):
+        self.stream = open(path, "a", buffering=1) if path else sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.as_dict(), default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+
+    def shutdown(self):
+        if self.stream is not sys.stderr:
+            self.stream.close()
+
+
+class PrometheusExporter(SpanExporter):
+    """
+    Aggregates spans into Prometheus histograms of duration and time to first token per span name,
+    and counters of prompt and completion tokens. `render` returns the text exposition format.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, prefix: str = "chatbot"):
+        self.prefix = prefix
+        self.histograms: dict[tuple[str, str], list] = {}
+        self.counters: dict[tuple[str, str], float] = {}
+        self.errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _observe(self, metric: str, name: str, value: float):
+        buckets, total, count = self.histograms.get((metric, name), ([0] * len(self.BUCKETS), 0.0, 0))
+        index = bisect_left(self.BUCKETS, value)
+        if index < len(buckets):
+            buckets[index] += 1
+        self.histograms[(metric, name)] = (buckets, total + value, count + 1)
+
+    def export(self, span: Span):
+        with self._lock:
+            self._observe("span_duration_seconds", span.name, span.duration)
+            if "ttft_s" in span.attributes:
+                self._observe("time_to_first_token_seconds", span.name, span.attributes["ttft_s"])
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if kind in span.attributes:
+                    key = (f"{kind}_total", span.name)
+                    self.counters[key] = self.counters.get(key, 0) + span.attributes[kind]
+            if span.error is not None:
+                self.errors[span.name] = self.errors.get(span.name, 0) + 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in sorted({metric for metric, _ in self.histograms}):
+                lines.append(f"# TYPE {self.prefix}_{metric} histogram")
+                for (m, name), (buckets, total, count) in sorted(self.histograms.items()):
+                    if m != metric:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(self.BUCKETS, buckets):
+                        cumulative += n
+                        lines.append(f'{self.prefix}_{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{self.prefix}_{metric}_bucket{{span="{name}",le="+Inf"}} {count}')
+                    lines.append(f'{self.prefix}_{metric}_sum{{span="{name}"}} {total}')
+                    lines.append(f'{self.prefix}_{metric}_count{{span="{name}"}} {count}')
+            for metric in sorted({metric for metric, _ in self.counters}):
+                lines.append(f"# TYPE {self.prefix}_{metric} counter")
+                for (m, name), value in sorted(self.counters.items()):
+                    if m == metric:
+                        lines.append(f'{self.prefix}_{metric}{{span="{name}"}} {value}')
+            if self.errors:
+                lines.append(f"# TYPE {self.prefix}_span_errors_total counter")
+                for name, value in sorted(self.errors.items()):
+                    lines.append(f'{self.prefix}_span_errors_total{{span="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0"):
+        """Serve `render()` at `/metrics` from a background thread."""
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, exporters: list[SpanExporter] = None):
+        self.exporters = list(exporters or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, parent: Span = None, **attributes) -> Span:
+        """Start a span that is not made current; the caller must `finish` it."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(name, parent if parent is not None else _current_span.get(), attributes)
+
+    def finish(self, span: Span, error: BaseException = None):
+        if span is NOOP_SPAN:
+            return
+        span.end()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def _span(self, name: str, parent: Span, attributes: dict) -> Iterator[Span]:
+        span = Span(name, parent if parent is not None else _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        else:
+            self.finish(span)
+        finally:
+            _current_span.reset(token)
+
+    def span(self, name: str, parent: Span = None, **attributes):
+        """Context manager timing the enclosed block as a child of the current span (or of `parent`)."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return self._span(name, parent, attributes)
+
+    def iter(self, name: str, iterable: Iterable, **attributes) -> Iterator:
+        """Iterate over `iterable`, recording the time spent producing each item as a span."""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, **attributes) as span:
+                item = next(iterator, _DONE)
+                if item is _DONE:
+                    span.set(exhausted=True)
+                    return
+                if hasattr(item, "__len__"):
+                    span.set(items=len(item))
+            yield item
+
+    def callbacks(self, parent: Span = None) -> list[BaseCallbackHandler]:
+        """
+        LangChain callbacks to pass in a run config, so LLM, tool and retriever calls become spans
+        under `parent` (default: the current span).
+        """
+        return [TracingCallbackHandler(self, parent)] if self.enabled else []
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+_DONE = object()
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records a span per LLM, tool and retriever run, nested under the span that started the chain."""
+
+    def __init__(self, tracer: Tracer, parent: Span = None):
+        self.tracer = tracer
+        self.parent = parent if parent is not None else tracer.current_span()
+        self.spans: dict[UUID, Span] = {}
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], **attributes):
+        parent = self.spans.get(parent_run_id) or self.parent
+        self.spans[run_id] = self.tracer.start_span(name, parent=parent, **attributes)
+
+    def _finish(self, run_id: UUID, error: BaseException = None) -> Optional[Span]:
+        span = self.spans.pop(run_id, None)
+        if span is not None:
+            self.tracer.finish(span, error)
+        return span
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        prompt = "".join(str(m.content) for batch in messages for m in batch)
+        self._start("llm", run_id, parent_run_id, model=_model_name(serialized, kwargs))
+        self.spans[run_id].set(prompt_chars=len(prompt))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", run_id, parent_run_id, model=_model_name(serialized, kwargs))
+        self.spans[run_id].set(prompt_chars=sum(len(p) for p in prompts))
+
+    def on_llm_new_token(self, token: str, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None and token:
+            span.first_token()
+            span.add(streamed_chunks=1)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            if usage:
+                span.set(
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0),
+                )
+            else:
+                # streamed responses carry no usage; count the generated text instead
+                text = "".join(g.text for generations in response.generations for g in generations)
+                span.set(completion_tokens=count_tokens(text))
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start("tool", run_id, parent_run_id, tool=serialized.get("name") or kwargs.get("name"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None:
+            span.set(output_chars=len(str(output)))
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start("retrieval", run_id, parent_run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None:
+            span.set(documents=len(documents))
+        self._finish(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+
+def _model_name(serialized: dict, kwargs: dict) -> Any:
+    params = kwargs.get("invocation_params") or {}
+    return params.get("model_name") or params.get("model") or (serialized or {}).get("name")
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def configure_tracing(exporters: list[SpanExporter] = None) -> Tracer:
+    """Replace the process-wide tracer. With no exporters tracing is disabled."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is not None:
+            _tracer.shutdown()
+        _tracer = Tracer(exporters)
+        return _tracer
+
+
+def exporters_from_env() -> list[SpanExporter]:
+    exporters = []
+    for name in filter(None, os.environ.get("TRACING_EXPORTERS", "").replace(" ", "").split(",")):
+        if name == "json":
+            exporters.append(JSONLogExporter(os.environ.get("TRACING_JSON_PATH")))
+        elif name == "prometheus":
+            exporter = PrometheusExporter()
+            exporter.serve(int(os.environ.get("TRACING_PROMETHEUS_PORT", 9464)))
+            exporters.append(exporter)
+        else:
+            raise ValueError(f"Unknown tracing exporter: {name}")
+    return exporters
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer, configured from the environment on first use."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(exporters_from_env())
+    return _tracer
@@ -1,6 +1,108 @@
+import asyncio
+import re
 from typing import Callable
 
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from api_chatbot_demo.ai.agents import ChatBot, QA_Bot
+from api_chatbot_demo.ai.checkpoint import CompactingSqliteSaver
+from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+from api_chatbot_demo.ai.index import FileIndexManager
+from tests.helpers import CountingEmbeddings, write_csv
+
+ANSWER = "Invoice INV-0007 was paid in full."
+
+
+class ScriptedChatModel(GenericFakeChatModel):
+    """Replies with the next scripted message, streaming tool calls whole and text word by word."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._generate(messages, stop=stop, run_manager=run_manager, **kwargs).generations[0].message
+        if message.tool_calls:
+            chunks = [AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": str(call["args"]).replace("'", '"'), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ])]
+        else:
+            chunks = [AIMessageChunk(content=token) for token in re.split(r"(\s)", message.content) if token]
+        for chunk in chunks:
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+def make_bot(tmp_path, monkeypatch) -> QA_Bot:
+    monkeypatch.setenv("YDC_API_KEY", "test")
+    llm = ScriptedChatModel(messages=iter([
+        AIMessage(content="", tool_calls=[{"name": "file_database", "args": {"query": "INV-0007"}, "id": "call_1"}]),
+        AIMessage(content=ANSWER),
+    ]))
+    files = {"invoices.csv": write_csv(tmp_path / "invoices.csv", [("INV-0007", "paid")])}
+    index = FileIndexManager(CountingEmbeddings(), MultiTypeDataLoader(), RecursiveCharacterTextSplitter())
+    index.sync(files)
+    checkpointer = CompactingSqliteSaver(str(tmp_path / "checkpoints.sqlite"), flush_interval=0)
+    return QA_Bot(
+        llm, "You answer questions about invoices.", files, MultiTypeDataLoader(), index=index,
+        checkpointer=checkpointer
+    )
+
 
 def test_import():
     from api_chatbot_demo.ai.agents import get_python_agent
     assert isinstance(get_python_agent, Callable)
+
+
+def test_astream_yields_tool_events_then_answer_tokens(tmp_path, monkeypatch):
+    bot = make_bot(tmp_path, monkeypatch)
+
+    async def collect():
+        events = []
+        async for event in bot.astream("Was INV-0007 paid?"):
+            # the history is only completed once the stream ends
+            events.append((event, len(bot.chat_history.messages)))
+        return events
+
+    events = asyncio.run(collect())
+    kinds = [event["event"] for event, _ in events]
+    assert kinds[:2] == ["tool_start", "tool_end"] and set(kinds[2:]) == {"token"}
+    assert events[0][0]["name"] == "file_database" and "INV-0007" in events[1][0]["data"]
+
+    tokens = [event["data"] for event, _ in events if event["event"] == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == ANSWER
+    assert all(history == 1 for _, history in events)
+
+    assert [m.content for m in bot.chat_history.messages] == ["Was INV-0007 paid?", ANSWER]
+    checkpoint = bot.checkpointer.get({"configurable": {"thread_id": bot.thread_id}})
+    assert checkpoint["channel_values"] == bot.chat_history.get_state()
+
+
+def test_arun_returns_the_answer_and_updates_history(tmp_path, monkeypatch):
+    bot = make_bot(tmp_path, monkeypatch)
+
+    assert asyncio.run(bot.arun("Was INV-0007 paid?")) == ANSWER
+    assert [m.content for m in bot.chat_history.messages] == ["Was INV-0007 paid?", ANSWER]
+
+
+def test_bots_without_native_streaming_yield_one_token():
+    class EchoBot(ChatBot):
+        def run(self, input: str) -> str:
+            return input.upper()
+
+    async def collect():
+        return [event async for event in EchoBot().astream("hello")]
+
+    assert asyncio.run(collect()) == [{"event": "token", "data": "HELLO"}]
+    assert asyncio.run(EchoBot().arun("hello")) == "HELLO"
+
+
+def test_an_empty_prebuilt_index_is_kept(monkeypatch):
+    monkeypatch.setenv("YDC_API_KEY", "test")
+    index = FileIndexManager(CountingEmbeddings(), MultiTypeDataLoader(), RecursiveCharacterTextSplitter())
+    bot = QA_Bot(ScriptedChatModel(messages=iter([])), "You answer questions.", {}, MultiTypeDataLoader(), index=index)
+    assert bot.index is index
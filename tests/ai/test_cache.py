@@ -0,0 +1,51 @@
+from api_chatbot_demo.ai.cache import SemanticResponseCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_and_lru():
+    clock = FakeClock()
+    cache = TTLCache(max_entries=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_semantic_response_cache():
+    cache = SemanticResponseCache(threshold=0.8)
+    cache.store("How do I stream research mode?", ["Use ", "stream=True"], namespace="smart")
+
+    assert cache.lookup("how do i stream research mode", namespace="smart") == ["Use ", "stream=True"]
+    assert cache.lookup("How do I stream Research mode!!", namespace="research") is None
+    assert cache.lookup("how do I stream the research mode", namespace="smart") == ["Use ", "stream=True"]
+    assert cache.lookup("what does the API cost", namespace="smart") is None
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_questions_differing_in_a_key_word_miss():
+    cache = SemanticResponseCache()
+    cache.store("How do I call the research endpoint in Python?", ["python answer"])
+    cache.store("What is the rate limit for the smart mode API?", ["smart answer"])
+    cache.store("How do I stream answers from the search API in node?", ["node answer"])
+
+    assert cache.lookup("How do I call the research endpoint in JavaScript?") is None
+    assert cache.lookup("What is the rate limit for the research mode API?") is None
+    assert cache.lookup("How do I stream answers from the search API in go?") is None
+    # rephrasings with the same content words still hit
+    assert cache.lookup("so how do I call the research endpoint in Python") == ["python answer"]
+    assert cache.stats()["misses"] == 3
@@ -0,0 +1,53 @@
+import time
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from api_chatbot_demo.ai.checkpoint import CompactingSqliteSaver
+
+
+def put(saver, thread_id, value):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": [HumanMessage(content=value)]}
+    return saver.put({"configurable": {"thread_id": thread_id}}, checkpoint, {"step": -1})
+
+
+def test_buffered_writes_are_visible_and_survive_reopen(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = CompactingSqliteSaver(path, flush_interval=0, batch_size=100)
+    put(saver, "a", "hello")
+    assert saver._pending
+    assert saver.get({"configurable": {"thread_id": "a"}})["channel_values"]["messages"][0].content == "hello"
+    saver.close()
+
+    reopened = CompactingSqliteSaver(path, flush_interval=0)
+    assert reopened.get({"configurable": {"thread_id": "a"}})["channel_values"]["messages"][0].content == "hello"
+    assert reopened.get({"configurable": {"thread_id": "b"}}) is None
+    reopened.close()
+
+
+def test_superseded_checkpoints_are_compacted(tmp_path):
+    saver = CompactingSqliteSaver(str(tmp_path / "checkpoints.sqlite"), flush_interval=0, keep_last=2)
+    for i in range(5):
+        put(saver, "a", f"turn {i}")
+    put(saver, "b", "other")
+    saver.flush()
+
+    history = list(saver.list({"configurable": {"thread_id": "a"}}))
+    assert [c.checkpoint["channel_values"]["messages"][0].content for c in history] == ["turn 4", "turn 3"]
+    assert len(list(saver.list(None))) == 3
+    saver.close()
+
+
+def test_idle_threads_expire(tmp_path):
+    saver = CompactingSqliteSaver(str(tmp_path / "checkpoints.sqlite"), flush_interval=0)
+    put(saver, "old", "bye")
+    saver.flush()
+    time.sleep(0.05)
+    put(saver, "new", "hi")
+    saver.flush()
+
+    assert saver.expire_idle(max_idle_seconds=0.02) == 1
+    assert saver.get({"configurable": {"thread_id": "old"}}) is None
+    assert saver.get({"configurable": {"thread_id": "new"}}) is not None
+    saver.close()
@@ -0,0 +1,50 @@
+from api_chatbot_demo.ai.conversation import ConversationSerializer
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def test_sliding_window_keeps_system_prompt():
+    serializer = ConversationSerializer(token_budget=9, token_counter=word_count)
+    messages = [{"role": "system", "content": "be nice"}]
+    for i in range(4):
+        messages.append({"role": "user", "content": f"question {i}"})
+        messages.append({"role": "assistant", "content": f"answer {i}"})
+    serializer.update(messages)
+
+    assert serializer.serialize() == "system:\tbe nice\nuser:\tquestion 3\nassistant:\tanswer 3\n"
+
+
+def test_summarizer_folds_dropped_turns():
+    serializer = ConversationSerializer(token_budget=10, token_counter=word_count, summarizer=lambda text: "old stuff")
+    messages = [{"role": "user", "content": f"turn {i}"} for i in range(5)]
+    serializer.update(messages)
+
+    query = serializer.serialize()
+
+    assert query.startswith("summary of earlier conversation:\told stuff\n")
+    assert query.endswith("user:\tturn 4\n")
+    assert "turn 0" not in query
+
+
+def test_delta_sends_only_new_turns():
+    serializer = ConversationSerializer()
+    messages = [{"role": "system", "content": "docs"}, {"role": "user", "content": "hi"}]
+    serializer.update(messages)
+    assert serializer.delta() == "system:\tdocs\nuser:\thi\n"
+
+    serializer.mark_synced(include_reply=True)
+    messages += [{"role": "assistant", "content": "hello"}, {"role": "user", "content": "more"}]
+    serializer.update(messages)
+
+    assert serializer.delta() == "user:\tmore\n"
+
+
+def test_cleared_history_resets():
+    serializer = ConversationSerializer()
+    serializer.update([{"role": "user", "content": "a"}, {"role": "user", "content": "b"}])
+    serializer.mark_synced()
+    serializer.update([{"role": "user", "content": "c"}])
+
+    assert serializer.delta() == "user:\tc\n"
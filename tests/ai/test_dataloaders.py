@@ -0,0 +1,98 @@
+import sqlite3
+from functools import partial
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+from api_chatbot_demo.ai.dataloaders import (
+    MultiTypeDataLoader,
+    RowGroupedCSVLoader,
+    SQLiteLoader,
+    connect_sqlite_read_only,
+    get_pdf_pool,
+)
+from api_chatbot_demo.ai.tokens import count_tokens
+from tests.helpers import write_database
+
+
+def write_pdf(path, num_pages):
+    with PdfPages(path) as pdf:
+        for page in range(num_pages):
+            fig = plt.figure()
+            fig.text(0.1, 0.5, f"page number {page}")
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def test_parallel_pdf_pages_in_order(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    write_pdf(path, 10)
+
+    loader = MultiTypeDataLoader(pdf_workers=2, pdf_pages_per_task=3)
+    docs = loader(path)
+
+    assert [doc.metadata["page"] for doc in docs] == list(range(10))
+    assert "page number 7" in docs[7].page_content
+    # later files reuse the pool, whose workers are spawned rather than forked from the server
+    pool = get_pdf_pool()
+    assert loader(path) == docs and get_pdf_pool() is pool
+    assert pool._mp_context.get_start_method() == "spawn"
+
+
+def test_iter_batches_bounded(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("a,b\n" + "".join(f"{i},{i * 2}\n" for i in range(10)))
+
+    # one row per document
+    loader = MultiTypeDataLoader({".csv": partial(RowGroupedCSVLoader, max_tokens=1)})
+    batches = list(loader.iter_batches([str(path)], batch_size=4))
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+
+def test_csv_rows_are_grouped_under_the_header(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("id,name,notes\n" + "".join(f'{i},"name, {i}",note {i}\n' for i in range(200)))
+
+    docs = list(RowGroupedCSVLoader(str(path), max_tokens=64).lazy_load())
+
+    assert 1 < len(docs) < 200
+    assert all(doc.page_content.startswith("id,name,notes\n") for doc in docs)
+    assert all(count_tokens(doc.page_content) <= 64 for doc in docs)
+    assert [doc.metadata["row"] for doc in docs[1:]] == [doc.metadata["last_row"] + 1 for doc in docs[:-1]]
+    assert docs[0].page_content.splitlines()[1] == '0,"name, 0",note 0'
+
+
+def test_csv_column_selection(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("id,name,notes\n1,a,x\n2,b\n")
+
+    (doc,) = RowGroupedCSVLoader(str(path), columns=["notes", "id"]).lazy_load()
+
+    assert doc.page_content == "notes,id\nx,1\n,2"
+    with pytest.raises(ValueError):
+        list(RowGroupedCSVLoader(str(path), columns=["missing"]).lazy_load())
+
+
+def test_sqlite_tables_stream_as_row_groups(tmp_path):
+    path = write_database(tmp_path / "shop.db", 500)
+
+    docs = MultiTypeDataLoader()(path)
+
+    customers = [doc for doc in docs if doc.metadata["table"] == "customers"]
+    orders = [doc for doc in docs if doc.metadata["table"] == "order items"]
+    assert customers[0].page_content == "Table customers\nid,name,photo\n1,Ada,<2 bytes>\n2,,"
+    assert len(orders) > 1 and orders[-1].metadata["last_row"] == 499
+    assert all(doc.page_content.startswith("Table order items\nid,customer_id,total\n") for doc in orders)
+    assert list(SQLiteLoader(path, tables=["customers"], fetch_size=1).lazy_load()) == customers
+
+
+def test_sqlite_uploads_are_opened_read_only(tmp_path):
+    path = write_database(tmp_path / "shop.db", 1)
+    with pytest.raises(sqlite3.OperationalError):
+        connect_sqlite_read_only(path).execute("DELETE FROM customers")
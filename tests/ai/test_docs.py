@@ -0,0 +1,24 @@
+from api_chatbot_demo.ai.docs import DocsSectionRetriever, split_markdown_sections
+from api_chatbot_demo.ai.prompts import API_DOCUMENTATION
+
+
+def test_split_ignores_comments_in_code():
+    sections = split_markdown_sections("# Top\nintro\n## Code\n```python\n# pip install x\n```\n## Other\ntext\n")
+    assert sections == ["# Top\nintro\n", "# Top\n## Code\n```python\n# pip install x\n```\n", "# Top\n## Other\ntext\n"]
+
+
+def test_retrieves_relevant_sections():
+    retriever = DocsSectionRetriever(k=2)
+    sections = retriever.retrieve("how do I stream events with sseclient?")
+
+    assert any("Streaming the events" in section for section in sections)
+    assert len("".join(sections)) < len(API_DOCUMENTATION) / 2
+    assert retriever.hit_rate == 1.0
+
+
+def test_hit_rate_ignores_stopword_matches():
+    retriever = DocsSectionRetriever(k=2)
+    retriever.retrieve("what parameters does the search endpoint take?")
+    for question in ["what is the weather like today?", "how do I do it?", "how do I use the news API?"]:
+        assert retriever.retrieve(question)
+    assert retriever.hit_rate == 0.25
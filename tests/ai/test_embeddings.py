@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from api_chatbot_demo.ai.embeddings import CachedEmbeddings, ConcurrentEmbedder, EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_cached_embeddings_reuse(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, cache)
+
+    first = embeddings.embed_documents(["a", "bb", "a"])
+    second = CachedEmbeddings(model, EmbeddingCache(cache.path)).embed_documents(["bb", "a"])
+
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second == [[2.0, 1.0], [1.0, 1.0]]
+    assert model.calls == 1
+
+
+def test_embedding_cache_lru_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_entries=2)
+    cache.set_many("m", {"a": [1.0]})
+    cache.set_many("m", {"b": [2.0]})
+    cache.get_many("m", ["a"])
+    cache.set_many("m", {"c": [3.0]})
+
+    assert set(cache.get_many("m", ["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["misses"] == 1
+
+
+def test_concurrent_embedder_keeps_order():
+    model = CountingEmbeddings()
+    embedder = ConcurrentEmbedder(model, batch_size=3, max_concurrency=2)
+    doc_batches = ([Document(page_content="x" * (i + 1))] for i in range(10))
+
+    results = list(embedder.embed_stream(doc_batches))
+
+    assert [len(docs) for docs, _ in results] == [3, 3, 3, 1]
+    assert [vector[0] for _, vectors in results for vector in vectors] == [float(i + 1) for i in range(10)]
+    assert embedder.stats.chunks == 10
+    assert model.calls == 4
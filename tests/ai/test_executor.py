@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+from langchain.agents import tool
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.runnables import RunnableLambda
+
+from api_chatbot_demo.ai.executor import ConcurrentAgentExecutor
+
+
+@tool
+def slow_search(query: str) -> str:
+    """Search that takes a while."""
+    time.sleep(0.3)
+    return f"results for {query}"
+
+
+@tool
+def stuck_search(query: str) -> str:
+    """Search that does not answer in time."""
+    time.sleep(1)
+    return "too late"
+
+
+def plan(inputs):
+    """Ask for every tool in `inputs["tools"]` at once, then answer with the observations."""
+    if inputs["intermediate_steps"]:
+        return AgentFinish({"output": [step for _, step in inputs["intermediate_steps"]]}, "")
+    return [AgentAction(name, inputs["input"], "") for name in inputs["tools"]]
+
+
+def test_tool_calls_of_a_step_run_concurrently(exporter):
+    executor = ConcurrentAgentExecutor(agent=RunnableLambda(plan), tools=[slow_search])
+    start = time.perf_counter()
+    output = executor.invoke({"input": "q", "tools": ["slow_search"] * 3})["output"]
+    elapsed = time.perf_counter() - start
+
+    assert output == ["results for q"] * 3
+    assert elapsed < 0.6
+    assert executor.tool_calls == 3 and executor.concurrent_steps == 1
+    assert executor.time_saved_s > 0.4
+    span = next(span for span in exporter.spans if span.name == "agent.tool_calls")
+    assert span.attributes["tools"] == 3 and span.attributes["saved_s"] > 0.4
+
+
+def test_tool_timeouts():
+    executor = ConcurrentAgentExecutor(
+        agent=RunnableLambda(plan), tools=[slow_search, stuck_search], tool_timeouts={"stuck_search": 0.1}
+    )
+    start = time.perf_counter()
+    output = executor.invoke({"input": "q", "tools": ["slow_search", "stuck_search"]})["output"]
+
+    assert output == ["results for q", "Tool stuck_search timed out after 0.1s"]
+    assert time.perf_counter() - start < 0.6
+    assert executor.timeouts == 1
+
+    output = asyncio.run(executor.ainvoke({"input": "q", "tools": ["stuck_search", "slow_search"]}))["output"]
+    assert output == ["Tool stuck_search timed out after 0.1s", "results for q"]
+    assert executor.timeouts == 2
+
+
+@tool
+def quick_search(query: str) -> str:
+    """Search that answers right away."""
+    return query
+
+
+def test_counters_add_up_across_concurrent_requests():
+    executor = ConcurrentAgentExecutor(agent=RunnableLambda(plan), tools=[quick_search])
+    requests = [
+        threading.Thread(target=executor.invoke, args=({"input": "q", "tools": ["quick_search"] * 2},))
+        for _ in range(8)
+    ]
+    for request in requests:
+        request.start()
+    for request in requests:
+        request.join()
+    assert (executor.tool_calls, executor.concurrent_steps, executor.timeouts) == (16, 8, 0)
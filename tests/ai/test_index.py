@@ -0,0 +1,123 @@
+from functools import partial
+
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader, RowGroupedCSVLoader
+from api_chatbot_demo.ai.index import FileIndexManager
+from api_chatbot_demo.ai.lexical import BM25Index, reciprocal_rank_fusion
+from tests.helpers import CountingEmbeddings, write_csv
+
+
+def test_sync_only_reindexes_changed_files(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = FileIndexManager(embeddings, MultiTypeDataLoader(), RecursiveCharacterTextSplitter(chunk_size=1000))
+    a = write_csv(tmp_path / "a.csv", [("x", 1), ("y", 2)])
+    b = write_csv(tmp_path / "b.csv", [("z", 3)])
+
+    # each small CSV file becomes a single chunk of rows
+    assert index.sync({"a.csv": a, "b.csv": b})["added"] == ["a.csv", "b.csv"]
+    assert len(index) == 2
+
+    embeddings.texts.clear()
+    b = write_csv(tmp_path / "b.csv", [("z", 3), ("w", 4)])
+    changes = index.sync({"b.csv": b})
+
+    assert changes == {"added": ["b.csv"], "removed": ["a.csv"], "unchanged": []}
+    assert len(embeddings.texts) == 1
+    assert len(index) == 1
+    assert {doc.metadata["file_name"] for doc in index.db.docstore._dict.values()} == {"b.csv"}
+
+
+def test_identical_files_share_vectors(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = FileIndexManager(embeddings, MultiTypeDataLoader(), RecursiveCharacterTextSplitter(chunk_size=1000))
+    a = write_csv(tmp_path / "a.csv", [("x", 1), ("y", 2)])
+    copy = write_csv(tmp_path / "copy.csv", [("x", 1), ("y", 2)])
+
+    index.sync({"a.csv": a, "copy.csv": copy})
+    assert len(embeddings.texts) == 1 and len(index) == 1
+    assert [doc.metadata["file_name"] for doc in index.db.docstore._dict.values()] == ["a.csv, copy.csv"]
+
+    index.sync({"copy.csv": copy})
+    assert len(index) == 1
+    assert [doc.metadata["file_name"] for doc in index.db.docstore._dict.values()] == ["copy.csv"]
+    index.sync({})
+    assert len(index) == 0
+
+
+class FlakyEmbeddings(CountingEmbeddings):
+    def __init__(self, fail_on_call):
+        super().__init__()
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("embedding service unavailable")
+        return super().embed_documents(texts)
+
+
+def test_failed_file_is_rolled_back(tmp_path):
+    embeddings = FlakyEmbeddings(fail_on_call=2)
+    # one row per chunk and per embedding request, so the file is added in several batches
+    loader = MultiTypeDataLoader({".csv": partial(RowGroupedCSVLoader, max_tokens=1)})
+    index = FileIndexManager(embeddings, loader, RecursiveCharacterTextSplitter(chunk_size=1000), max_concurrency=1)
+    index.embedder.batch_size = 1
+    a = write_csv(tmp_path / "a.csv", [(f"row{i}", i) for i in range(4)])
+
+    with pytest.raises(RuntimeError):
+        index.sync({"a.csv": a})
+    assert len(index) == len(index.lexical) == 0 and not index.file_ids
+
+    assert index.sync({"a.csv": a})["added"] == ["a.csv"]
+    assert len(index) == len(index.lexical) == 4
+
+
+class QueryCountingEmbeddings(CountingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+def test_hybrid_retrieval_and_lexical_fast_path(tmp_path):
+    embeddings = QueryCountingEmbeddings()
+    index = FileIndexManager(embeddings, MultiTypeDataLoader(), RecursiveCharacterTextSplitter(chunk_size=1000))
+    rows = [(f"INV-{i:04d}", "paid" if i % 2 else "overdue invoice for consulting") for i in range(40)]
+    index.sync({"a.csv": write_csv(tmp_path / "a.csv", rows)})
+    retriever = index.as_retriever(k=2)
+    assert len(index.lexical) == len(index) > 1
+
+    docs = retriever.invoke("INV-0007")
+    assert "INV-0007" in docs[0].page_content and embeddings.queries == []
+
+    docs = retriever.invoke("which customers still have to pay for consulting work?")
+    assert len(docs) == 2 and embeddings.queries
+    assert "consulting" in docs[0].page_content
+
+    # nothing matches lexically, so the forced lexical search falls back to hybrid retrieval
+    queries = len(embeddings.queries)
+    assert len(index.as_retriever(k=2, mode="lexical").invoke("unrelated question")) == 2
+    assert len(embeddings.queries) == queries + 1
+
+    index.sync({})
+    assert len(index.lexical) == 0 and retriever.invoke("INV-0007") == []
+
+
+def test_lookup_detection_and_rank_fusion():
+    lexical = BM25Index()
+    lexical.add("1", "user_id INV-0042 status paid")
+    lexical.add("2", "revenue grew in 2023 despite supply risks")
+    assert lexical.is_lookup("INV-0042") and lexical.is_lookup("user_id INV-0042") and lexical.is_lookup("find user_id")
+    assert lexical.is_lookup("status paid")
+    assert not lexical.is_lookup("which invoices are still open?") and not lexical.is_lookup("INV-9999")
+    # questions that only mention an indexed identifier are answered by hybrid retrieval
+    assert not lexical.is_lookup("where is user_id used?")
+    assert not lexical.is_lookup("what were the main risks to revenue discussed in 2023?")
+
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]]) == ["b", "a", "d", "c"]
@@ -0,0 +1,46 @@
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from api_chatbot_demo.ai.memory import SummaryBufferChatHistory
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def test_old_turns_are_summarized():
+    history = SummaryBufferChatHistory(
+        llm=FakeListLLM(responses=["they said hello"]), max_token_limit=4, token_counter=word_count
+    )
+    history.add_user_message("hello there")
+    history.add_ai_message("hi friend")
+    history.add_user_message("what now")
+    history.wait()
+
+    messages = history.messages
+    assert isinstance(messages[0], SystemMessage)
+    assert messages[0].content.endswith("they said hello")
+    assert messages[1:] == [AIMessage(content="hi friend"), HumanMessage(content="what now")]
+
+
+def test_without_llm_keeps_a_sliding_window():
+    history = SummaryBufferChatHistory(max_token_limit=2, token_counter=word_count)
+    for i in range(5):
+        history.add_user_message(f"turn {i}")
+
+    assert history.messages == [HumanMessage(content="turn 4")]
+
+
+class FailingLLM(FakeListLLM):
+    def invoke(self, *args, **kwargs):
+        raise ConnectionError("service unavailable")
+
+
+def test_failed_summaries_are_logged_and_keep_the_old_summary(caplog):
+    history = SummaryBufferChatHistory(llm=FailingLLM(responses=[]), max_token_limit=2, token_counter=word_count)
+    history.add_user_message("hello there")
+    history.add_ai_message("hi friend")
+    history.wait()
+
+    assert "chat history summarization failed" in caplog.text and "service unavailable" in caplog.text
+    assert history.summary == "" and history.messages == [AIMessage(content="hi friend")]
@@ -0,0 +1,61 @@
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+from api_chatbot_demo.ai.index import FileIndexManager
+from api_chatbot_demo.ai.registry import BotRegistry
+from api_chatbot_demo.streamlit.utils import UploadedFile
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def write_csv(path, rows):
+    path.write_text("name,value\n" + "".join(f"{name},{value}\n" for name, value in rows))
+    return UploadedFile(name=path.name, path=str(path))
+
+
+def test_registry_shares_and_clones_indexes(tmp_path):
+    embeddings = CountingEmbeddings()
+    registry = BotRegistry()
+
+    def create_index():
+        return FileIndexManager(embeddings, MultiTypeDataLoader(), RecursiveCharacterTextSplitter())
+
+    a = write_csv(tmp_path / "a.csv", [("x", 1), ("y", 2)])
+    first = registry.get_index({"a.csv": a}, create_index)
+    second = registry.get_index({"a.csv": a}, create_index)
+    assert first is second
+    assert len(embeddings.texts) == 1
+
+    b = write_csv(tmp_path / "b.csv", [("z", 3)])
+    extended = registry.get_index({"a.csv": a, "b.csv": b}, create_index, base=first)
+
+    assert len(embeddings.texts) == 2
+    assert len(first) == 1
+    assert len(extended) == 2
+    assert registry.stats()["indexes"] == 2
+
+
+def test_registry_evicts_least_recently_used(tmp_path):
+    registry = BotRegistry(max_bytes=1)
+
+    def create_index():
+        return FileIndexManager(CountingEmbeddings(), MultiTypeDataLoader(), RecursiveCharacterTextSplitter())
+
+    a = write_csv(tmp_path / "a.csv", [("x", 1)])
+    b = write_csv(tmp_path / "b.csv", [("y", 2)])
+    registry.get_index({"a.csv": a}, create_index)
+    registry.get_index({"b.csv": b}, create_index)
+
+    assert registry.stats()["indexes"] == 1
+    assert registry.get_index({"b.csv": b}, create_index) is registry.indexes[next(iter(registry.indexes))]
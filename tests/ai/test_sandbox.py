@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.runnables import RunnableLambda
+
+from api_chatbot_demo.ai.sandbox import PooledPythonREPLTool, PythonSessionCallbackHandler, PythonWorkerPool
+
+
+@pytest.fixture
+def pool():
+    pool = PythonWorkerPool(num_workers=1, timeout=5, memory_limit_mb=512, max_runs_per_worker=3)
+    yield pool
+    pool.close()
+
+
+def test_executes_with_fresh_state(pool):
+    assert pool.execute("x = 1\nprint(x + 1)") == "2\n"
+    assert "NameError" in pool.execute("print(x)")
+
+
+def test_sessions_keep_their_namespace_until_ended():
+    pool = PythonWorkerPool(num_workers=2, timeout=5, memory_limit_mb=512)
+    try:
+        pool.execute("x = 1", session="a")
+        pool.execute("x = 2", session="b")
+        assert pool.execute("x += 10\nprint(x)", session="a") == "11\n"
+        assert pool.execute("print(x)", session="b") == "2\n"
+        assert pool.stats()["sessions"] == 2
+
+        pool.end_session("a")
+        assert pool.stats()["sessions"] == 1
+        assert "NameError" in pool.execute("print(x)", session="a")
+        # a timeout kills the worker, and the session's state with it
+        assert "timed out" in pool.execute("while True: pass", timeout=0.2, session="b")
+        assert "NameError" in pool.execute("print(x)", session="b")
+    finally:
+        pool.close()
+
+
+def test_unused_sessions_expire(pool):
+    pool.session_timeout = 0.1
+    pool.execute("x = 1", session="a")
+    time.sleep(0.2)
+    # with a single worker this would wait forever if the expired session still held it
+    assert "NameError" in pool.execute("print(x)")
+    assert pool.stats()["sessions"] == 0
+
+
+def test_timeouts_and_crashes_replace_the_worker(pool):
+    assert pool.execute("while True: pass", timeout=0.2) == "Execution timed out after 0.2s"
+    assert "exited unexpectedly" in pool.execute("import os; os._exit(1)")
+    assert pool.execute("print('still serving')") == "still serving\n"
+
+    stats = pool.stats()
+    assert (stats["executions"], stats["timeouts"], stats["crashes"]) == (3, 1, 1)
+
+
+def test_memory_limit(pool):
+    assert "MemoryError" in pool.execute("x = bytearray(2 * 1024**3)")
+
+
+def test_workers_are_recycled(pool):
+    first = pool._idle.queue[0].process.pid
+    for _ in range(3):
+        pool.execute("pass")
+    assert pool._idle.queue[0].process.pid != first
+    assert pool.stats()["recycled"] == 1
+
+
+def test_callers_queue_for_a_free_worker(pool):
+    threads = [threading.Thread(target=pool.execute, args=("import time; time.sleep(0.2)",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = pool.stats()
+    assert stats["max_queue_depth"] >= 2 and stats["queue_depth"] == 0
+    assert stats["avg_wait_s"] > 0
+
+
+def test_waiting_for_a_worker_times_out(pool):
+    # the only worker is held by a session
+    pool.execute("x = 1", session="a")
+    start = time.perf_counter()
+    assert pool.execute("print(1)", timeout=0.2) == "Execution failed: no Python worker became free within 0.2s"
+    assert time.perf_counter() - start < 1
+    assert pool.stats()["busy"] == 1 and pool.stats()["queue_depth"] == 0
+
+    pool.end_session("a")
+    assert pool.execute("print(1)") == "1\n"
+
+
+def test_tool_sanitizes_input(pool):
+    tool = PooledPythonREPLTool(pool=pool)
+    assert tool.run("```python\nprint(6 * 7)\n```") == "42\n"
+
+
+def test_agent_steps_share_a_session(pool):
+    commands = iter(["import math\nx = math.sqrt(16)", "print(x + 38)"])
+
+    def plan(inputs):
+        if len(inputs["intermediate_steps"]) == 2:
+            return AgentFinish({"output": inputs["intermediate_steps"][-1][1]}, "")
+        return AgentAction("Python_REPL", next(commands), "")
+
+    executor = AgentExecutor(
+        agent=RunnableLambda(plan),
+        tools=[PooledPythonREPLTool(pool=pool)],
+        callbacks=[PythonSessionCallbackHandler(pool)],
+    )
+    assert executor.invoke({"input": "compute"})["output"] == "42.0\n"
+    assert pool.stats()["sessions"] == 0 and pool.stats()["idle"] == 1
@@ -0,0 +1,76 @@
+import tiktoken
+from langchain_core.documents import Document
+
+from api_chatbot_demo.ai.splitters import ChunkSize, TokenChunker
+from api_chatbot_demo.ai.tokens import count_tokens
+
+SENTENCE = "The search API returns ranked results for a query."
+
+
+def test_chunks_fit_and_end_at_the_best_boundary():
+    paragraphs = ["\n".join([SENTENCE] * 3), " ".join([SENTENCE] * 2), "A closing line without punctuation"]
+    text = "\n\n".join(paragraphs * 4)
+    chunker = TokenChunker(chunk_size=40, chunk_overlap=0)
+    chunks = chunker.split_text(text)
+
+    assert all(count_tokens(chunk) <= 40 for chunk in chunks)
+    assert all(chunk == chunk.strip() and chunk for chunk in chunks)
+    assert all(chunk.endswith((".", "punctuation")) for chunk in chunks)
+    # no text is lost or duplicated without overlap
+    assert "".join(chunks).replace(" ", "").replace("\n", "") == text.replace(" ", "").replace("\n", "")
+
+
+def test_overlap_and_long_sentences():
+    words = " ".join(f"word{i}" for i in range(300))
+    chunker = TokenChunker(chunk_size=50, chunk_overlap=10)
+    chunks = chunker.split_text(words)
+
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert all(a.split()[-1] in b.split()[:10] for a, b in zip(chunks, chunks[1:]))
+    assert chunks[-1].endswith("word299")
+    assert chunker.split_text("x" * 1000) == ["x" * 1000]
+    assert chunker.split_text("  \n\n ") == []
+
+
+def test_chunk_sizes_per_file_type():
+    text = " ".join([SENTENCE] * 20)
+    chunker = TokenChunker(
+        chunk_size=400, chunk_overlap=0, chunk_sizes={".csv": ChunkSize(30, 0)}, add_start_index=True
+    )
+    csv_chunks = chunker.split_documents([Document(page_content=text, metadata={"source": "rows.CSV"})])
+    other_chunks = chunker.split_documents([Document(page_content=text, metadata={"source": "a.pdf"})])
+
+    assert len(csv_chunks) > len(other_chunks) == 1
+    assert all(chunk.metadata["source"] == "rows.CSV" for chunk in csv_chunks)
+    assert all(text[c.metadata["start_index"]:].startswith(c.page_content) for c in csv_chunks)
+
+
+def byte_level_encoding():
+    """A small BPE encoding built locally, so the tiktoken path runs offline; tokens may split characters."""
+    ranks = {bytes([i]): i for i in range(256)}
+    for merge in [b"th", b"the", b" the", b"\xc3\xa9", b"caf", b"caf\xc3\xa9", b"\xe2\x80"]:
+        ranks[merge] = len(ranks)
+    return tiktoken.Encoding(
+        "test_bytes", pat_str=r"""'s|\s?\w+|\s?[^\s\w]+|\s+""", mergeable_ranks=ranks, special_tokens={}
+    )
+
+
+def test_token_counts_with_a_tiktoken_encoding(monkeypatch):
+    from api_chatbot_demo.ai import splitters, tokens
+
+    encoding = byte_level_encoding()
+    monkeypatch.setattr(tokens, "get_encoding", lambda name: encoding)
+    monkeypatch.setattr(splitters, "get_encoding", lambda name: encoding)
+    tokens.token_byte_lengths.cache_clear()
+    try:
+        text = "The café — ✓ then 😀 the end.\n\nThe théâtre, the café."
+        offsets = list(range(len(text) + 1))
+        _, token_starts = encoding.decode_with_offsets(encoding.encode(text))
+        expected = [sum(start < offset for start in token_starts) for offset in offsets]
+        chunker = TokenChunker(chunk_size=20, chunk_overlap=0, encoding_name="test_bytes")
+        counts = chunker.token_counter(text)(offsets)
+        assert counts == expected
+        assert counts[-1] == len(encoding.encode(text))
+        assert all(len(encoding.encode(chunk)) <= 20 for chunk in chunker.split_text(text * 5))
+    finally:
+        tokens.token_byte_lengths.cache_clear()
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from langchain_community.tools.you import YouSearchTool
+from langchain_community.utilities.you import YouSearchAPIWrapper
+
+from api_chatbot_demo.ai.cache import SingleFlight, TTLCache
+from api_chatbot_demo.ai.tools import CachedYouSearchAPIWrapper, create_database_schema_tool
+from tests.helpers import write_database
+
+RAW_RESULTS = {"hits": [{"url": "https://you.com", "title": "You", "description": "d", "snippets": ["s"]}]}
+
+
+def test_cached_search_single_flight(monkeypatch):
+    calls = []
+
+    def slow_raw_results(self, query, **kwargs):
+        calls.append(query)
+        time.sleep(0.2)
+        return RAW_RESULTS
+
+    monkeypatch.setattr(YouSearchAPIWrapper, "raw_results", slow_raw_results)
+    wrapper = CachedYouSearchAPIWrapper(
+        ydc_api_key="key", num_web_results=3, cache=TTLCache(ttl=60), single_flight=SingleFlight()
+    )
+    tool = YouSearchTool(api_wrapper=wrapper)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tool.run("solar eclipse"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.append(tool.run("solar eclipse"))
+
+    assert calls == ["solar eclipse"]
+    assert len(results) == 5
+    assert all(result == results[0] for result in results)
+
+
+def test_database_schema_tool(tmp_path):
+    tool = create_database_schema_tool({"shop.db": write_database(tmp_path / "shop.db", 1)})
+
+    schema = tool.run("shop.db")
+    assert schema.startswith("shop.db:\n") and "CREATE TABLE customers" in schema
+    assert tool.run("") == schema
+    assert "shop.db" in tool.description
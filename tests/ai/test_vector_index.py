@@ -0,0 +1,64 @@
+import hashlib
+from functools import partial
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader, RowGroupedCSVLoader
+from api_chatbot_demo.ai.index import FileIndexManager
+from api_chatbot_demo.ai.vector_index import choose_index_spec, needs_rebuild
+from tests.helpers import write_csv
+
+
+class RandomEmbeddings(Embeddings):
+    """Deterministic pseudo-random 256-d vectors per text."""
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(256).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def test_index_kind_and_storage_follow_corpus_size():
+    assert choose_index_spec(500, 1536).factory == "Flat"
+    assert choose_index_spec(50_000, 1536).factory == "HNSW32_SQfp16"
+    assert choose_index_spec(500_000, 1536).factory == "IVF2828,PQ384"
+    # too few vectors to train a product quantizer
+    assert choose_index_spec(500, 1536, kind="flat", storage="pq").factory == "SQfp16"
+
+    ivf = choose_index_spec(500_000, 1536)
+    assert not needs_rebuild(ivf, choose_index_spec(600_000, 1536))
+    assert needs_rebuild(ivf, choose_index_spec(20_000_000, 1536))
+
+
+@pytest.mark.parametrize("kind, storage, min_recall, max_memory", [
+    # float16 codes plus graph links; one-byte codes for every four dimensions plus list ids
+    ("hnsw", "float16", 0.9, 0.8),
+    ("ivf", "pq", 0.3, 0.1),
+])
+def test_quantized_index_build_and_removal(tmp_path, kind, storage, min_recall, max_memory):
+    # one row per chunk
+    loader = MultiTypeDataLoader({".csv": partial(RowGroupedCSVLoader, max_tokens=1)})
+    index = FileIndexManager(
+        RandomEmbeddings(), loader, RecursiveCharacterTextSplitter(), index_kind=kind, index_storage=storage
+    )
+    a = write_csv(tmp_path / "a.csv", [(f"a{i}", i) for i in range(1200)])
+    b = write_csv(tmp_path / "b.csv", [(f"b{i}", i) for i in range(300)])
+    index.sync({"a.csv": a, "b.csv": b})
+
+    report = index.build_report
+    assert report["chunks"] == len(index) == 1500
+    assert report["index"] == index.index_spec.factory and index.index_spec.kind == kind
+    assert report["recall_at_10"] >= min_recall
+    assert report["index_bytes"] <= max_memory * report["flat_index_bytes"]
+
+    # removing a file re-adds the remaining vectors, and positions still map to the right chunks
+    index.sync({"b.csv": b})
+    assert len(index) == 300 and index.index_spec.kind == kind
+    doc = index.documents(index.lexical_search("b42", 1))[0]
+    assert index.vector_search(doc.page_content, 1) == index.lexical_search("b42", 1)
+    assert index.clone().vector_search(doc.page_content, 1) == index.lexical_search("b42", 1)
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_chatbot_demo.ai.ydc import AsyncYDCClient, YDCClient, parse_sse
+
+
+class FlakyYDCHandler(BaseHTTPRequestHandler):
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        if type(self).requests_seen % 2 == 1:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"event: search_results\ndata: []\n\nevent: token\ndata: Hello\n\nevent: token\ndata:  world\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UnicodeYDCHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # no charset in the Content-Type, as the real API sends it
+        body = "event: token\ndata: café\n\nevent: token\ndata:  — ✓\n\n".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def ydc_server():
+    server = serve(FlakyYDCHandler)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_parse_sse():
+    events = list(parse_sse(["event: token", "data: a", "", ": comment", "data: b", "data: c", ""]))
+    assert [(e.event, e.data) for e in events] == [("token", "a"), ("message", "b\nc")]
+
+
+def test_stream_answer_retries(ydc_server):
+    client = YDCClient("key", base_url=ydc_server, backoff_factor=0.01)
+    assert "".join(client.stream_answer("hi", chat_id="c")) == "Hello world"
+
+
+def test_async_stream_answer_retries(ydc_server):
+    async def collect():
+        client = AsyncYDCClient("key", base_url=ydc_server, backoff_factor=0.01)
+        try:
+            return "".join([token async for token in client.stream_answer("hi")])
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(collect()) == "Hello world"
+
+
+def test_stream_answer_decodes_utf8():
+    server = serve(UnicodeYDCHandler)
+    try:
+        client = YDCClient("key", base_url=f"http://127.0.0.1:{server.server_port}")
+        assert "".join(client.stream_answer("hi")) == "café — ✓"
+    finally:
+        server.shutdown()
@@ -0,0 +1,12 @@
+import pytest
+
+from api_chatbot_demo.tracing import configure_tracing
+from tests.helpers import ListExporter
+
+
+@pytest.fixture
+def exporter():
+    exporter = ListExporter()
+    configure_tracing([exporter])
+    yield exporter
+    configure_tracing()
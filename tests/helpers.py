@@ -0,0 +1,44 @@
+"""Fakes and fixture files shared by several test modules."""
+import sqlite3
+
+from langchain_core.embeddings import Embeddings
+
+from api_chatbot_demo.streamlit.utils import UploadedFile
+from api_chatbot_demo.tracing import SpanExporter
+
+
+class ListExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def write_csv(path, rows):
+    path.write_text("name,value\n" + "".join(f"{name},{value}\n" for name, value in rows))
+    return UploadedFile(name=path.name, path=str(path))
+
+
+def write_database(path, num_orders):
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, photo BLOB)")
+        connection.execute('CREATE TABLE "order items" (id INTEGER, customer_id INTEGER, total REAL)')
+        connection.execute("INSERT INTO customers VALUES (1, 'Ada', x'0102'), (2, NULL, NULL)")
+        connection.executemany(
+            'INSERT INTO "order items" VALUES (?, ?, ?)', [(i, i % 2 + 1, i * 1.5) for i in range(num_orders)]
+        )
+    connection.close()
+    return str(path)
@@ -0,0 +1,88 @@
+from streamlit.testing.v1 import AppTest
+
+# the first run imports langchain, which can take longer than AppTest's default of 3s
+TIMEOUT = 20
+
+
+def chat_app(num_messages: int):
+    from api_chatbot_demo.streamlit.llm_blocks import chat_messages_st_block
+
+    messages = [("user" if i % 2 == 0 else "assistant", f"message {i}") for i in range(num_messages)]
+    chat_messages_st_block(messages, key="test", window=4, page_size=3)
+
+
+def test_only_the_window_is_rendered_as_chat_bubbles():
+    app = AppTest.from_function(chat_app, args=(10,), default_timeout=TIMEOUT).run()
+
+    assert len(app.chat_message) == 4
+    assert [m.markdown[0].value for m in app.chat_message] == [f"message {i}" for i in range(6, 10)]
+    assert app.toggle[0].label == "Show earlier messages (6)"
+    assert not any("message 0" in m.value for m in app.markdown)
+
+
+def test_earlier_messages_are_paginated_and_cached():
+    app = AppTest.from_function(chat_app, args=(10,), default_timeout=TIMEOUT).run()
+    app.toggle[0].set_value(True).run()
+
+    # six older messages in pages of three; the newest page is shown first
+    assert app.number_input[0].value == 2
+    assert "message 3" in app.markdown[0].value and "message 5" in app.markdown[0].value
+
+    app.number_input[0].set_value(1).run()
+    assert "message 0" in app.markdown[0].value and "message 3" not in app.markdown[0].value
+    assert len(app.session_state["test_page_cache"]) == 2
+
+
+def reset_chat_app():
+    import streamlit as st
+
+    from api_chatbot_demo.streamlit.llm_blocks import chat_messages_st_block
+
+    # both chats open with the same greeting and reach the same length
+    prefix = "new" if st.session_state.get("reset") else "old"
+    messages = [("assistant", "How can I help?")] + [("user", f"{prefix} question {i}") for i in range(9)]
+    chat_messages_st_block(messages, key="test", window=4, page_size=3)
+
+
+def test_replaced_history_is_not_served_from_the_page_cache():
+    app = AppTest.from_function(reset_chat_app, default_timeout=TIMEOUT).run()
+    # the first page starts with the greeting
+    app.toggle[0].set_value(True).run()
+    app.number_input[0].set_value(1).run()
+    assert "old question 1" in app.markdown[0].value
+
+    app.session_state["reset"] = True
+    app.run()
+    assert "new question 1" in app.markdown[0].value and "old" not in app.markdown[0].value
+
+
+class RecordingStatus:
+    def __init__(self):
+        self.calls = []
+
+    def update(self, **kwargs):
+        self.calls.append(("update", kwargs))
+
+    def write(self, text):
+        self.calls.append(("write", text))
+
+
+def test_stream_chatbot_answer_reports_tool_calls():
+    from api_chatbot_demo.ai.agents import ChatBot
+    from api_chatbot_demo.streamlit.llm_blocks import stream_chatbot_answer
+
+    class ScriptedBot(ChatBot):
+        async def astream(self, input):
+            yield {"event": "tool_start", "name": "file_database", "data": {"query": input}}
+            yield {"event": "tool_end", "name": "file_database", "data": "INV-0007,paid"}
+            for token in ["It ", "was ", "paid."]:
+                yield {"event": "token", "data": token}
+
+    status = RecordingStatus()
+    assert list(stream_chatbot_answer(ScriptedBot(), "INV-0007", status)) == ["It ", "was ", "paid."]
+    assert status.calls == [
+        ("update", {"label": "Calling file_database...", "state": "running"}),
+        ("write", "`file_database`: {'query': 'INV-0007'}"),
+        ("update", {"label": "file_database done"}),
+        ("update", {"label": "Done", "state": "complete"}),
+    ]
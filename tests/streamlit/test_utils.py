@@ -0,0 +1,126 @@
+import asyncio
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from api_chatbot_demo.streamlit.utils import (
+    AnsiHTMLRenderer,
+    UploadStore,
+    iter_over_async,
+    iter_stdout,
+    stdout_to_html,
+)
+
+
+def chatty(n, delay):
+    for i in range(n):
+        print(f"line {i}")
+        time.sleep(delay)
+    return "done"
+
+
+def test_iter_stdout_streams_coalesced_chunks():
+    chunks = list(iter_stdout(chatty, 20, 0.01, flush_interval=0.05))
+    assert "".join(chunks) == "".join(f"line {i}\n" for i in range(20))
+    # output arrives while the function runs, but not one chunk per print
+    assert 1 < len(chunks) < 40
+
+
+def test_iter_stdout_only_captures_the_worker_thread():
+    other = threading.Thread(target=chatty, args=(3, 0.01))
+
+    def start_other_and_print():
+        other.start()
+        chatty(3, 0.01)
+        other.join()
+
+    chunks = list(iter_stdout(start_other_and_print, flush_interval=0.01))
+    assert "".join(chunks).count("line 0") == 1
+
+
+def test_iter_stdout_reraises_after_output():
+    def failing():
+        print("about to fail")
+        raise ValueError("boom")
+
+    chunks = []
+    with pytest.raises(ValueError):
+        for chunk in iter_stdout(failing):
+            chunks.append(chunk)
+    assert chunks == ["about to fail\n"]
+
+
+def test_iter_over_async_hands_over_items_as_they_arrive():
+    received = threading.Event()
+
+    async def numbers():
+        yield 0
+        # only continues once the consumer has the first item, so items cannot be buffered until the end
+        await asyncio.to_thread(received.wait, 5)
+        for i in range(1, 5):
+            yield i
+
+    items = []
+    for item in iter_over_async(numbers()):
+        items.append(item)
+        received.set()
+    assert items == [0, 1, 2, 3, 4]
+
+
+def test_iter_over_async_reraises_after_items():
+    async def failing():
+        yield "partial"
+        raise ValueError("boom")
+
+    items = []
+    with pytest.raises(ValueError, match="boom"):
+        for item in iter_over_async(failing()):
+            items.append(item)
+    assert items == ["partial"]
+
+
+def test_incremental_ansi_rendering_carries_styles_across_chunks():
+    text = "\x1b[32mgreen start\nstill green\x1b[0m plain \x1b[1mbold\x1b[0m end"
+    renderer = AnsiHTMLRenderer()
+    # split inside the colour span and inside an escape sequence
+    in_colour, in_escape = text.index("still"), text.index("\x1b[1m") + 2
+    for chunk in (text[:in_colour], text[in_colour:in_escape], text[in_escape:]):
+        renderer.feed(chunk)
+
+    html = renderer.html()
+    assert 'class="ansi32">still green' in html
+    assert 'class="ansi1">bold' in html
+    assert "\x1b" not in html and "[1m" not in html
+    assert "plain" in stdout_to_html(text)
+
+
+def test_upload_store_deduplicates_and_reference_counts(tmp_path):
+    store = UploadStore(root=str(tmp_path), chunk_size=4)
+    a = store.save(io.BytesIO(b"same contents"), "a.csv")
+    b = store.save(io.BytesIO(b"same contents"), "b.csv")
+    c = store.save(io.BytesIO(b"other contents"), "c.csv")
+
+    assert a.path == b.path != c.path and a.path.endswith(".csv")
+    assert a.content_hash == os.path.basename(a.path)[:-4]
+    assert (store.writes, store.skipped_writes) == (2, 1)
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(a.path), os.path.basename(c.path)])
+
+    store.release(a.path)
+    assert os.path.exists(b.path)
+    store.release(b.path)
+    assert not os.path.exists(b.path)
+
+
+def test_replacing_an_upload_with_the_same_contents_keeps_the_stored_file(tmp_path):
+    store = UploadStore(root=str(tmp_path))
+    previous = store.save(io.BytesIO(b"same contents"), "a.csv")
+    # the order of `file_upload_st_block`: take the new reference, then drop the replaced one
+    file = store.save(io.BytesIO(b"same contents"), "a.csv")
+    store.release(previous.path)
+
+    assert os.path.exists(file.path)
+    assert (store.writes, store.skipped_writes) == (1, 1)
+    assert store.refcounts == {file.path: 1}
@@ -0,0 +1,20 @@
+import json
+
+from benchmarks.run import compare, main
+
+
+def test_benchmarks_run_offline(tmp_path, capsys):
+    output = tmp_path / "bench.json"
+    assert main(["--files", "1", "--rows", "20", "--repeats", "1", "--latency", "0", "--output", str(output)]) == 0
+
+    results = json.loads(output.read_text())["results"]
+    assert results["ingestion_chunks"] > 0
+    assert results["ydc_ttft_p50_s"] <= results["ydc_total_p50_s"]
+    assert json.loads(capsys.readouterr().out)["results"] == results
+
+
+def test_compare_flags_regressions():
+    baseline = {"run_p50_s": 1.0, "ingestion_chunks_per_s": 100.0}
+    assert compare({"run_p50_s": 1.1, "ingestion_chunks_per_s": 90.0}, baseline, tolerance=0.2) == []
+    regressions = compare({"run_p50_s": 1.5, "ingestion_chunks_per_s": 50.0}, baseline, tolerance=0.2)
+    assert [r.split(":")[0] for r in regressions] == ["ingestion_chunks_per_s", "run_p50_s"]
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from api_chatbot_demo.ai.dataloaders import MultiTypeDataLoader
+from api_chatbot_demo.ai.index import FileIndexManager
+from api_chatbot_demo.tracing import (
+    NOOP_SPAN,
+    JSONLogExporter,
+    PrometheusExporter,
+    Tracer,
+)
+from tests.helpers import CountingEmbeddings, ListExporter, write_csv
+
+
+def test_disabled_tracer_is_a_noop():
+    tracer = Tracer()
+    assert tracer.span("anything") is NOOP_SPAN
+    assert tracer.callbacks() == []
+    assert list(tracer.iter("items", [1, 2])) == [1, 2]
+
+
+def test_spans_nest_and_export(tmp_path):
+    exporter = ListExporter()
+    log = tmp_path / "spans.jsonl"
+    tracer = Tracer([exporter, JSONLogExporter(str(log))])
+
+    with tracer.span("outer") as outer:
+        with tracer.span("inner", tokens=3) as inner:
+            inner.first_token()
+    with pytest.raises(ValueError):
+        with tracer.span("failing"):
+            raise ValueError("boom")
+    tracer.shutdown()
+
+    assert [span.name for span in exporter.spans] == ["inner", "outer", "failing"]
+    assert inner.parent_id == outer.span_id and inner.trace_id == outer.trace_id
+    assert "ttft_s" in inner.attributes
+    assert exporter.spans[-1].error == "ValueError: boom"
+    assert [json.loads(line)["name"] for line in log.read_text().splitlines()] == ["inner", "outer", "failing"]
+
+
+def test_prometheus_exporter_renders_histograms_and_counters():
+    prometheus = PrometheusExporter()
+    tracer = Tracer([prometheus])
+    for _ in range(2):
+        with tracer.span("llm", completion_tokens=5) as span:
+            span.first_token()
+
+    text = prometheus.render()
+    assert 'chatbot_span_duration_seconds_count{span="llm"} 2' in text
+    assert 'chatbot_time_to_first_token_seconds_bucket{span="llm",le="+Inf"} 2' in text
+    assert 'chatbot_completion_tokens_total{span="llm"} 10' in text
+
+
+def test_llm_calls_become_child_spans(exporter):
+    from api_chatbot_demo.tracing import get_tracer
+
+    tracer = get_tracer()
+    with tracer.span("chat.turn") as turn:
+        FakeListLLM(responses=["four words of output"]).invoke("hi", config={"callbacks": tracer.callbacks()})
+
+    llm = next(span for span in exporter.spans if span.name == "llm")
+    assert llm.parent_id == turn.span_id
+    assert llm.attributes["completion_tokens"] > 0
+
+
+def test_ingestion_stages_are_traced(exporter, tmp_path):
+    index = FileIndexManager(CountingEmbeddings(), MultiTypeDataLoader(), RecursiveCharacterTextSplitter())
+    index.sync({"a.csv": write_csv(tmp_path / "a.csv", [("x", 1), ("y", 2)])})
+
+    names = {span.name for span in exporter.spans}
+    assert {"file.load", "file.split", "embed", "index.build", "index.add_file", "index.sync"} <= names
+    sync = next(span for span in exporter.spans if span.name == "index.sync")
+    embed = next(span for span in exporter.spans if span.name == "embed")
+    assert sync.attributes["embed_chunks"] == 1
+    assert embed.trace_id == sync.trace_id